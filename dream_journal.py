@@ -1,18 +1,63 @@
-import random
-from datetime import datetime
-import hashlib
+import time
+
+STARTUP_STARTED = time.perf_counter()  # Reported when DREAM_JOURNAL_PROFILE_STARTUP is set
+
+import atexit
+import bisect
+import contextlib
+import heapq
+import json
+import math
+import mmap
 import os
+import re
 import sys
-import msvcrt  # For Windows
+import threading
+import zlib
+from collections import Counter, OrderedDict, deque
+from functools import lru_cache
 
-try:
-    import termios  # For Unix/Linux/Mac
-    import tty
-except ImportError:
-    pass
+# random, hashlib, datetime and the platform keyboard modules (msvcrt on
+# Windows, termios/tty elsewhere) are imported by the functions that need
+# them, so the journal starts quickly and runs on every platform.
 
 current_user = None
-login_attempts = {}  # Track login attempts per username
+
+DREAMS_FILE = "dreams.txt"
+DREAMS_INDEX_FILE = "dreams.idx"  # Index of DREAMS_FILE, with one shard per user under dreams.idx.d/
+DREAMS_SHARD_CACHE_SIZE = 256  # Users' index shards kept in memory
+DREAMS_DELETED_FILE = "dreams.del"  # Tombstone log of deleted dream ids
+COMPACT_DELETED_RATIO = 0.25  # Compact once this share of dreams.txt is deleted
+MAX_LOGIN_ATTEMPTS = 5  # Failed logins allowed within LOGIN_ATTEMPT_WINDOW
+LOGIN_ATTEMPT_WINDOW = 15 * 60  # Seconds a failed login counts against the user
+LOGIN_ATTEMPTS_FILE = os.environ.get("DREAM_JOURNAL_LOGIN_ATTEMPTS_FILE", "login_attempts.log")  # "" keeps them in memory
+LOGIN_TRACKER_MAX_USERS = 10000  # Users with recent failures kept in memory
+LOGIN_ATTEMPTS_COMPACT_BYTES = 64 * 1024  # Rewrite the attempts log once it grows past this
+SYNC_WRITES = True  # fsync journal commits and file rewrites
+GROUP_COMMIT_SIZE = 500  # Appends buffered per journal commit inside a batch
+PARALLEL_STATS_MIN_BYTES = 4 * 1024 * 1024  # Smaller corpora are analyzed in-process
+PROFILE_STARTUP = bool(os.environ.get("DREAM_JOURNAL_PROFILE_STARTUP"))  # Print time to the first screen
+STORAGE_BACKEND = os.environ.get("DREAM_JOURNAL_BACKEND", "text")  # "text" or "sqlite"
+DATABASE_FILE = os.environ.get("DREAM_JOURNAL_DATABASE", "dream_journal.db")
+CUSTOM_SYMBOLS_FILE = "custom_symbols.txt"
+USERS_FILE = "users.txt"
+USERS_INDEX_FILE = "users.idx"  # Username -> record offset index for USERS_FILE
+PROMPT_SESSIONS_FILE = "prompt_sessions.txt"  # Dream recall sessions, one JSON line each
+PROMPT_SESSIONS_INDEX_FILE = "prompt_sessions.idx"  # Per-user session offset index for PROMPT_SESSIONS_FILE
+LEGACY_PROMPT_FILE_PATTERN = re.compile(r"dream_prompts_(\w+?)_(\d{4}-\d{2}-\d{2})_(\d{2})-(\d{2})-(\d{2})\.txt")
+ENCRYPTION_KEY = b"dream_journal_secret_key"
+PASSWORD_HASHER = os.environ.get("DREAM_JOURNAL_PASSWORD_HASHER", "pbkdf2_sha256")  # "pbkdf2_sha256" or "scrypt"
+PBKDF2_ITERATIONS = int(os.environ.get("DREAM_JOURNAL_PBKDF2_ITERATIONS", "600000"))  # Cost of pbkdf2_sha256
+SCRYPT_LOG2_N = int(os.environ.get("DREAM_JOURNAL_SCRYPT_LOG2_N", "14"))  # Cost of scrypt, N = 2 ** this
+PASSWORD_SALT_BYTES = 16
+PASSWORD_CACHE_SIZE = 1024  # Successful password checks remembered per process
+CRYPT_CHUNK_SIZE = len(ENCRYPTION_KEY) * 4096  # Whole key repeats per chunk when streaming files
+DREAMS_PAGE_SIZE = 5  # Dreams shown per page when viewing the journal
+MIN_DATE = "1900-01-01"  # Earliest date accepted anywhere in the journal
+MAX_DATE = "2100-12-31"
+DREAM_FIELDS = ('username', 'date', 'title', 'description', 'mood', 'dream_type', 'intensity', 'symbols')
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+INVALID_TEXT_CHAR = re.compile(r"[^A-Za-z0-9 .,!?'\-:;()&]")  # Anything validate_text rejects
 
 DREAM_PROMPTS = [
     "Were there any people in your dream?",
@@ -63,6 +108,13 @@ def clear_screen():
     os.system('cls' if os.name == 'nt' else 'clear')
 
 
+def current_time(time_format):
+    """Return the current local time formatted with strftime"""
+    from datetime import datetime
+
+    return datetime.now().strftime(time_format)
+
+
 def print_color(text, color):
     """Print colored text"""
     print(f"{color}{text}{Colors.END}")
@@ -73,7 +125,12 @@ def get_password_with_asterisks(prompt):
     print(f"{Colors.YELLOW}{prompt}{Colors.END}", end='', flush=True)
     password = ""
 
+    if not sys.stdin.isatty():  # Piped input, nothing to hide
+        return input()
+
     if os.name == 'nt':  # Windows
+        import msvcrt
+
         while True:
             char = msvcrt.getch()
             if char in [b'\r', b'\n']:  # Enter key
@@ -87,6 +144,9 @@ def get_password_with_asterisks(prompt):
                 password += char.decode('utf-8')
                 print('*', end='', flush=True)
     else:  # Unix/Linux/Mac
+        import termios
+        import tty
+
         fd = sys.stdin.fileno()
         old_settings = termios.tcgetattr(fd)
         try:
@@ -250,32 +310,183 @@ def validate_password(password):
     return True
 
 
-def hash_password(password):
-    """Hash password for secure storage"""
-    return hashlib.sha256(password.encode()).hexdigest()
+def pbkdf2_sha256(password, salt, cost):
+    """Derive a key with PBKDF2-HMAC-SHA256 using cost iterations"""
+    import hashlib
+
+    return hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, cost)
+
+
+def scrypt(password, salt, cost):
+    """Derive a key with scrypt using N = 2 ** cost, r = 8, p = 1"""
+    import hashlib
+
+    return hashlib.scrypt(password.encode("utf-8"), salt=salt, n=2 ** cost, r=8, p=1,
+                          maxmem=2 * 128 * 8 * 2 ** cost)
+
+
+PASSWORD_HASHERS = {
+    # name -> (key derivation function, configuration variable, configured cost, lowest and highest cost accepted)
+    'pbkdf2_sha256': (pbkdf2_sha256, "DREAM_JOURNAL_PBKDF2_ITERATIONS", PBKDF2_ITERATIONS, 1000, 10000000),
+    'scrypt': (scrypt, "DREAM_JOURNAL_SCRYPT_LOG2_N", SCRYPT_LOG2_N, 10, 18),  # 2 ** 18 needs 256 MiB per check
+}
+password_cache = OrderedDict()  # (stored hash, keyed password digest) -> True, least recently used first
+PASSWORD_CACHE_KEY = os.urandom(16)  # Keeps plain password digests out of the cache
+
+
+def password_cost_in_range(hasher, cost):
+    """Return True if cost is one the hasher accepts"""
+    lowest, highest = PASSWORD_HASHERS[hasher][3:]
+    return lowest <= cost <= highest
+
+
+def password_cost(hasher):
+    """Return the configured cost for a hasher, raising ValueError if the hasher or its setting is invalid"""
+    if hasher not in PASSWORD_HASHERS:
+        raise ValueError(f"Unknown password hasher {hasher!r}, use one of: {', '.join(sorted(PASSWORD_HASHERS))}")
+    _, variable, cost, lowest, highest = PASSWORD_HASHERS[hasher]
+    if not password_cost_in_range(hasher, cost):
+        raise ValueError(f"{variable} must be between {lowest} and {highest} for {hasher}, not {cost}")
+    return cost
+
+
+def hash_password(password, hasher=None, cost=None):
+    """Hash password for secure storage as "hasher$cost$salt$hash" with a random per-user salt"""
+    hasher = hasher or PASSWORD_HASHER
+    cost = cost or password_cost(hasher)
+    if not password_cost_in_range(hasher, cost):
+        raise ValueError(f"Cost {cost} is out of range for {hasher}")
+    salt = os.urandom(PASSWORD_SALT_BYTES)
+    derive = PASSWORD_HASHERS[hasher][0]
+    return f"{hasher}${cost}${salt.hex()}${derive(password, salt, cost).hex()}"
+
+
+def verify_password(password, stored_hash):
+    """Check a password against a stored hash, including legacy unsalted SHA-256 hashes"""
+    import hashlib
+    import hmac
+
+    cache_key = (stored_hash, hmac.new(PASSWORD_CACHE_KEY, password.encode("utf-8"), "sha256").digest())
+    if password_cache.pop(cache_key, False):
+        password_cache[cache_key] = True  # Most recently used again; pop and set are each atomic across threads
+        return True
+
+    parts = stored_hash.split("$")
+    if len(parts) == 1:
+        computed = hashlib.sha256(password.encode()).hexdigest()
+    elif len(parts) == 4 and parts[0] in PASSWORD_HASHERS:
+        hasher, cost, salt, _ = parts
+        try:
+            if not password_cost_in_range(hasher, int(cost)):
+                return False  # A corrupt or hostile cost could take minutes or all memory to check
+            derived = PASSWORD_HASHERS[hasher][0](password, bytes.fromhex(salt), int(cost))
+        except (ValueError, OverflowError, MemoryError):
+            return False
+        computed = f"{hasher}${cost}${salt}${derived.hex()}"
+    else:
+        return False
+
+    if not hmac.compare_digest(computed, stored_hash):
+        return False
+    password_cache[cache_key] = True
+    if len(password_cache) > PASSWORD_CACHE_SIZE:
+        with contextlib.suppress(KeyError):  # Another thread may have evicted it first
+            password_cache.popitem(last=False)
+    return True
+
+
+def password_needs_rehash(stored_hash):
+    """Return True if a stored hash is legacy SHA-256 or uses a different hasher or cost than configured"""
+    parts = stored_hash.split("$")
+    return len(parts) != 4 or parts[0] != PASSWORD_HASHER or parts[1] != str(password_cost(PASSWORD_HASHER))
+
+
+def benchmark_password_hashing(hasher=None, costs=None, duration=1.0):
+    """Print how many logins per second one core and all cores manage at several costs"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    hasher = hasher or PASSWORD_HASHER
+    default_cost = password_cost(hasher)
+    if not costs:
+        costs = ([default_cost - 2, default_cost - 1, default_cost, default_cost + 1] if hasher == 'scrypt'
+                 else [default_cost // 4, default_cost // 2, default_cost, default_cost * 2])
+        costs = [cost for cost in costs if password_cost_in_range(hasher, cost)]
+    workers = os.cpu_count() or 1
+
+    def logins_per_second(stored_hash, threads):
+        checks = 0
+        started = time.perf_counter()
+        with ThreadPoolExecutor(threads) as executor:
+            # hashlib releases the GIL while deriving keys, so threads show the whole machine's throughput
+            while time.perf_counter() - started < duration:
+                password_cache.clear()
+                checks += sum(executor.map(lambda _: verify_password("benchmark", stored_hash), range(threads)))
+        return checks / (time.perf_counter() - started)
+
+    print(f"{hasher} ({workers} CPU{'s' if workers != 1 else ''})")
+    print(f"{'cost':>10} {'ms/login':>10} {'logins/s (1 core)':>18} {f'logins/s ({workers} threads)':>22}")
+    for cost in costs:
+        stored_hash = hash_password("benchmark", hasher, cost)
+        single = logins_per_second(stored_hash, 1)
+        parallel = logins_per_second(stored_hash, workers)
+        print(f"{cost:>10} {1000 / single:>10.1f} {single:>18.1f} {parallel:>22.1f}")
+
+
+def xor_bytes(data, position=0):
+    """XOR a whole buffer with the repeating key, starting at the given key position"""
+    if not data:
+        return b""
+    start = position % len(ENCRYPTION_KEY)
+    repeats = (start + len(data)) // len(ENCRYPTION_KEY) + 1
+    keystream = (ENCRYPTION_KEY * repeats)[start:start + len(data)]
+    mixed = int.from_bytes(data, "big") ^ int.from_bytes(keystream, "big")
+    return mixed.to_bytes(len(data), "big")
 
 
 def encrypt_data(data):
     """Simple encryption for demonstration"""
-    key = "dream_journal_secret_key"
-    encrypted = ""
-    for i, char in enumerate(data):
-        encrypted += chr(ord(char) ^ ord(key[i % len(key)]))
-    return encrypted.encode().hex()
+    return xor_bytes(data.encode("utf-8")).hex()
 
 
 def decrypt_data(encrypted_hex):
     """Decrypt data"""
     try:
         encrypted_bytes = bytes.fromhex(encrypted_hex)
-        key = "dream_journal_secret_key"
-        decrypted = ""
-        for i, char_code in enumerate(encrypted_bytes):
-            decrypted += chr(char_code ^ ord(key[i % len(key)]))
-        return decrypted
-    except:
+    except (ValueError, TypeError):
         return None
 
+    try:
+        return xor_bytes(encrypted_bytes).decode("utf-8")
+    except UnicodeDecodeError:
+        pass
+
+    # Older versions XORed characters rather than bytes before encoding;
+    # the two only differ for non-ASCII text
+    try:
+        key = ENCRYPTION_KEY.decode("ascii")
+        text = encrypted_bytes.decode("utf-8")
+        return "".join(chr(ord(char) ^ ord(key[i % len(key)])) for i, char in enumerate(text))
+    except UnicodeDecodeError:
+        return None
+
+
+def crypt_stream(source, target, chunk_size=CRYPT_CHUNK_SIZE):
+    """Encrypt or decrypt a binary stream chunk by chunk (XOR is its own inverse)"""
+    position = 0
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        target.write(xor_bytes(chunk, position))
+        position += len(chunk)
+    return position
+
+
+def crypt_file(source_path, target_path, chunk_size=CRYPT_CHUNK_SIZE):
+    """Encrypt or decrypt a whole file without loading it into memory"""
+    with open(source_path, "rb") as source, open(target_path, "wb") as target:
+        return crypt_stream(source, target, chunk_size)
+
 
 def reset_password(username):
     """Reset password for a user after failed attempts"""
@@ -288,76 +499,50 @@ def reset_password(username):
     display_warning(f"Password reset required for user: {username}")
     print_color("You've exceeded the maximum login attempts. Please reset your password.\n", Colors.YELLOW)
 
-    # Read all users
     try:
-        with open("users.txt", "r") as file:
-            encrypted_users = file.readlines()
-    except FileNotFoundError:
-        display_error("User database not found!")
+        user = user_directory.find(username)
+    except IOError:
+        user = None
+
+    if not user:
+        display_error("User not found in database!")
         input(f"\n{Colors.CYAN}Press Enter to continue...{Colors.END}")
         return False
 
-    user_found = False
-    new_users_data = []
-
-    # Find the user and update their password
-    for encrypted_user in encrypted_users:
-        decrypted_data = decrypt_data(encrypted_user.strip())
-        if decrypted_data:
-            parts = decrypted_data.split("|")
-            if len(parts) >= 3:
-                stored_username, stored_password, full_name = parts
-                if stored_username.lower() == username.lower():
-                    user_found = True
-
-                    # Get new password
-                    while True:
-                        try:
-                            new_password = get_password_with_asterisks("🔒 Enter new password (minimum 6 characters): ")
-                            validate_password(new_password)
-                            break
-                        except ValueError as e:
-                            display_error(str(e))
+    # Get new password
+    while True:
+        try:
+            new_password = get_password_with_asterisks("🔒 Enter new password (minimum 6 characters): ")
+            validate_password(new_password)
+            break
+        except ValueError as e:
+            display_error(str(e))
 
-                    # Confirm new password
-                    while True:
-                        confirm_password = get_password_with_asterisks("🔒 Confirm new password: ")
-                        if confirm_password == new_password:
-                            break
-                        else:
-                            display_error("Passwords do not match! Please try again.")
-                            # If confirmation fails, go back to entering new password
-                            continue
+    # Confirm new password
+    while True:
+        confirm_password = get_password_with_asterisks("🔒 Confirm new password: ")
+        if confirm_password == new_password:
+            break
+        else:
+            display_error("Passwords do not match! Please try again.")
+            # If confirmation fails, go back to entering new password
+            continue
 
-                    # Update the user data with new hashed password
-                    new_hashed_password = hash_password(new_password)
-                    user_data = f"{stored_username}|{new_hashed_password}|{full_name}"
-                    encrypted_data = encrypt_data(user_data)
-                    new_users_data.append(encrypted_data + "\n")
+    # Update the user record with new hashed password
+    try:
+        user_directory.update_password(username, hash_password(new_password))
+    except IOError:
+        display_error("Could not update user data.")
+        input(f"\n{Colors.CYAN}Press Enter to continue...{Colors.END}")
+        return False
 
-                    display_success("Password reset successfully! You can now login with your new password.")
+    display_success("Password reset successfully! You can now login with your new password.")
 
-                    # Reset login attempts for this user
-                    if username.lower() in login_attempts:
-                        del login_attempts[username.lower()]
-                else:
-                    new_users_data.append(encrypted_user)
+    # Reset login attempts for this user
+    login_attempts.clear(username)
 
-    if user_found:
-        # Write updated users back to file
-        try:
-            with open("users.txt", "w") as file:
-                file.writelines(new_users_data)
-            input(f"\n{Colors.CYAN}Press Enter to continue...{Colors.END}")
-            return True
-        except IOError:
-            display_error("Could not update user data.")
-            input(f"\n{Colors.CYAN}Press Enter to continue...{Colors.END}")
-            return False
-    else:
-        display_error("User not found in database!")
-        input(f"\n{Colors.CYAN}Press Enter to continue...{Colors.END}")
-        return False
+    input(f"\n{Colors.CYAN}Press Enter to continue...{Colors.END}")
+    return True
 
 
 def register_user():
@@ -375,21 +560,9 @@ def register_user():
                     f"{Colors.YELLOW}👤 Enter username (3-20 characters, letters/numbers/_): {Colors.END}").strip()
                 validate_username(username)
 
-                try:
-                    with open("users.txt", "r") as file:
-                        users = file.readlines()
-                        for user in users:
-                            stored_data = user.strip()
-                            decrypted_data = decrypt_data(stored_data)
-                            if decrypted_data:
-                                parts = decrypted_data.split("|")
-                                if len(parts) >= 3:
-                                    stored_username = parts[0]
-                                    if stored_username.lower() == username.lower():
-                                        display_warning("Username already exists! Please choose another.")
-                                        continue
-                except FileNotFoundError:
-                    pass
+                if user_directory.find(username):
+                    display_warning("Username already exists! Please choose another.")
+                    continue
 
                 break
             except ValueError as e:
@@ -424,12 +597,12 @@ def register_user():
                 display_error(str(e))
 
         hashed_password = hash_password(password)
-        user_data = f"{username}|{hashed_password}|{full_name}"
-        encrypted_data = encrypt_data(user_data)
 
         try:
-            with open("users.txt", "a") as file:
-                file.write(encrypted_data + "\n")
+            if not user_directory.add(username, hashed_password, full_name):
+                display_warning("Username already exists! Please choose another.")
+                input(f"\n{Colors.CYAN}Press Enter to continue...{Colors.END}")
+                return False
             display_success("Registration successful! You can now login.")
             input(f"\n{Colors.CYAN}Press Enter to continue...{Colors.END}")
             return True
@@ -445,8 +618,13 @@ def register_user():
 
 
 def login_user():
-    """Login existing user with attempt tracking"""
-    global current_user, login_attempts
+    """Login existing user with attempt tracking
+
+    Runs as a small state machine: the user record is read once, then the
+    password prompt loops until it succeeds or the user is locked out and
+    sent to reset their password.
+    """
+    global current_user
 
     clear_screen()
     print_color("=" * 60, Colors.CYAN)
@@ -455,15 +633,7 @@ def login_user():
     print()
 
     try:
-        try:
-            with open("users.txt", "r") as file:
-                encrypted_users = file.readlines()
-        except FileNotFoundError:
-            display_warning("No users registered yet. Please register first.")
-            input(f"\n{Colors.CYAN}Press Enter to continue...{Colors.END}")
-            return False
-
-        if not encrypted_users:
+        if not user_directory.count():
             display_warning("No users registered yet. Please register first.")
             input(f"\n{Colors.CYAN}Press Enter to continue...{Colors.END}")
             return False
@@ -474,76 +644,61 @@ def login_user():
             input(f"\n{Colors.CYAN}Press Enter to continue...{Colors.END}")
             return False
 
-        # Initialize or get login attempts for this username
-        username_lower = username.lower()
-        if username_lower not in login_attempts:
-            login_attempts[username_lower] = 0
+        user = user_directory.find(username)
 
         # Check if user has exceeded login attempts
-        if login_attempts[username_lower] >= 5:
-            display_warning(f"Too many failed login attempts for user: {username}")
-            print_color("You need to reset your password to continue.\n", Colors.YELLOW)
-            input(f"\n{Colors.CYAN}Press Enter to reset password...{Colors.END}")
-            if reset_password(username):
-                # After reset, allow login with new password
-                login_attempts[username_lower] = 0
-                display_info("Please login with your new password.")
-                input(f"\n{Colors.CYAN}Press Enter to continue...{Colors.END}")
-                return False
-            else:
-                return False
-
-        password = get_password_with_asterisks("🔒 Enter password: ")
-        if not password:
-            display_error("Password cannot be empty!")
-            input(f"\n{Colors.CYAN}Press Enter to continue...{Colors.END}")
-            return False
-
-        hashed_password = hash_password(password)
-        user_found = False
+        state = "locked" if login_attempts.failures(username) >= MAX_LOGIN_ATTEMPTS else "password"
+        while True:
+            if state == "password":
+                password = get_password_with_asterisks("🔒 Enter password: ")
+                if not password:
+                    display_error("Password cannot be empty!")
+                    input(f"\n{Colors.CYAN}Press Enter to continue...{Colors.END}")
+                    return False
+
+                if not user:
+                    display_error("Username not found!")
+                    input(f"\n{Colors.CYAN}Press Enter to continue...{Colors.END}")
+                    return False
+
+                if verify_password(password, user['password']):
+                    state = "success"
+                    continue
 
-        for encrypted_user in encrypted_users:
-            try:
-                decrypted_data = decrypt_data(encrypted_user.strip())
-                if decrypted_data:
-                    parts = decrypted_data.split("|")
-                    if len(parts) >= 3:
-                        stored_username, stored_password, full_name = parts
-
-                        if stored_username.lower() == username_lower:
-                            user_found = True
-                            if stored_password == hashed_password:
-                                current_user = {
-                                    'username': stored_username,
-                                    'full_name': full_name
-                                }
-                                # Reset login attempts on successful login
-                                login_attempts[username_lower] = 0
-                                display_success(f"Login successful! Welcome back, {full_name}! 🌟")
-                                input(f"\n{Colors.CYAN}Press Enter to continue...{Colors.END}")
-                                return True
-                            else:
-                                login_attempts[username_lower] += 1
-                                attempts_left = 5 - login_attempts[username_lower]
-                                display_error(f"Incorrect password! Attempts left: {attempts_left}")
-                                if attempts_left > 0:
-                                    input(f"\n{Colors.CYAN}Press Enter to try again...{Colors.END}")
-                                    return login_user()  # Recursive call to try again
-                                else:
-                                    display_warning("Maximum login attempts reached!")
-                                    input(f"\n{Colors.CYAN}Press Enter to reset password...{Colors.END}")
-                                    if reset_password(username):
-                                        login_attempts[username_lower] = 0
-                                        return False
-                                    else:
-                                        return False
-            except Exception:
-                continue
+                attempts_left = MAX_LOGIN_ATTEMPTS - login_attempts.record_failure(username)
+                display_error(f"Incorrect password! Attempts left: {max(attempts_left, 0)}")
+                if attempts_left > 0:
+                    input(f"\n{Colors.CYAN}Press Enter to try again...{Colors.END}")
+                else:
+                    display_warning("Maximum login attempts reached!")
+                    state = "reset"
+
+            elif state == "locked":
+                display_warning(f"Too many failed login attempts for user: {username}")
+                print_color("You need to reset your password to continue.\n", Colors.YELLOW)
+                state = "reset"
+
+            elif state == "reset":
+                input(f"\n{Colors.CYAN}Press Enter to reset password...{Colors.END}")
+                if reset_password(username):
+                    # After reset, allow login with new password
+                    display_info("Please login with your new password.")
+                    input(f"\n{Colors.CYAN}Press Enter to continue...{Colors.END}")
+                return False
 
-        if not user_found:
-            display_error("Username not found!")
-            input(f"\n{Colors.CYAN}Press Enter to continue...{Colors.END}")
-            return False
+            elif state == "success":
+                if password_needs_rehash(user['password']):
+                    # Upgrade legacy or outdated hashes now that we have the plain password
+                    user_directory.update_password(user['username'], hash_password(password))
+                current_user = {
+                    'username': user['username'],
+                    'full_name': user['full_name']
+                }
+                # Reset login attempts on successful login
+                login_attempts.clear(username)
+                display_success(f"Login successful! Welcome back, {user['full_name']}! 🌟")
+                input(f"\n{Colors.CYAN}Press Enter to continue...{Colors.END}")
+                return True
 
     except Exception as e:
         display_error(f"Unexpected error: {e}")
@@ -580,33 +735,40 @@ def auth_menu():
             input(f"\n{Colors.CYAN}Press Enter to continue...{Colors.END}")
 
 
-def validate_date(date_str):
-    """Validate date format YYYY-MM-DD"""
-    if not date_str:
-        return True
-
-    if len(date_str) != 10 or date_str[4] != '-' or date_str[7] != '-':
-        return False
+@lru_cache(maxsize=4096)
+def parse_date(date_str):
+    """Parse a YYYY-MM-DD date into a day ordinal, or None if it is not a real date in the supported range"""
+    if not MIN_DATE <= date_str <= MAX_DATE or len(date_str) != 10 or date_str[4] != '-' or date_str[7] != '-':
+        return None
 
-    parts = date_str.split('-')
-    if len(parts) != 3:
-        return False
+    digits = date_str[:4] + date_str[5:7] + date_str[8:]
+    if not (digits.isascii() and digits.isdigit()):
+        return None
 
     try:
-        year = int(parts[0])
-        month = int(parts[1])
-        day = int(parts[2])
+        from datetime import date
 
-        if year < 1900 or year > 2100:
-            return False
-        if month < 1 or month > 12:
-            return False
-        if day < 1 or day > 31:
-            return False
+        return date(int(date_str[:4]), int(date_str[5:7]), int(date_str[8:])).toordinal()
+    except ValueError:
+        return None
 
+
+def validate_date(date_str):
+    """Validate date format YYYY-MM-DD and that the date exists"""
+    if not date_str:
         return True
-    except ValueError:
-        return False
+
+    return parse_date(date_str) is not None
+
+
+def date_range(start_date, end_date):
+    """Fill in the open ends of a date range, rejecting dates that do not exist"""
+    start_date = start_date or MIN_DATE
+    end_date = end_date or MAX_DATE
+    for date in (start_date, end_date):
+        if parse_date(date) is None:
+            raise ValueError(f"Invalid date: {date}")
+    return start_date, end_date
 
 
 def validate_text(text, field_name):
@@ -614,12 +776,11 @@ def validate_text(text, field_name):
     if not text or not text.strip():
         raise ValueError(f"{field_name} cannot be empty!")
 
-    allowed_chars = set("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 .,!?'-:;()&")
-
-    for char in text:
-        if char not in allowed_chars:
-            raise ValueError(
-                f"{field_name} contains invalid character: '{char}'. Only letters, numbers, and basic punctuation allowed.")
+    invalid = INVALID_TEXT_CHAR.search(text)
+    if invalid:
+        raise ValueError(
+            f"{field_name} contains invalid character: '{invalid.group()}'. "
+            "Only letters, numbers, and basic punctuation allowed.")
 
     return True
 
@@ -629,6 +790,9 @@ def validate_letters_only(text, field_name):
     if not text or not text.strip():
         raise ValueError(f"{field_name} cannot be empty!")
 
+    if "".join(text.split()).isalpha():
+        return True
+
     for char in text:
         if not (char.isalpha() or char.isspace()):
             raise ValueError(f"{field_name} can only contain letters! Found invalid character: '{char}'")
@@ -640,11 +804,2304 @@ def validate_number(text, min_val, max_val, field_name):
     """Validate that input is a number within range"""
     try:
         num = int(text)
-        if num < min_val or num > max_val:
-            raise ValueError(f"{field_name} must be between {min_val} and {max_val}!")
-        return num
     except ValueError:
         raise ValueError(f"{field_name} must be a valid number!")
+    if num < min_val or num > max_val:
+        raise ValueError(f"{field_name} must be between {min_val} and {max_val}!")
+    return num
+
+
+class Dream:
+    """One dream entry, with intensity as an int and symbols pre-split into a tuple"""
+
+    __slots__ = ('id',) + DREAM_FIELDS
+
+    def __init__(self, username, date, title, description, mood, dream_type, intensity, symbols, dream_id=None):
+        self.id = dream_id
+        self.username = username
+        self.date = date
+        self.title = title
+        self.description = description
+        self.mood = mood
+        self.dream_type = dream_type
+        self.intensity = intensity  # None when the stored value is not a number
+        self.symbols = symbols
+
+    @classmethod
+    def from_text(cls, username, date, title, description, mood, dream_type, intensity, symbols, dream_id=None):
+        """Build a dream from raw text fields, parsing intensity and splitting symbols"""
+        try:
+            intensity = int(intensity)
+        except (TypeError, ValueError):
+            intensity = None
+        symbols = tuple(symbol.strip() for symbol in symbols.split(",") if symbol.strip())
+        return cls(username, date, title, description, mood, dream_type, intensity, symbols, dream_id)
+
+    @property
+    def intensity_text(self):
+        """Intensity as stored in the file"""
+        return "" if self.intensity is None else str(self.intensity)
+
+    @property
+    def symbols_text(self):
+        """Symbols as a comma-separated string"""
+        return ", ".join(self.symbols)
+
+    def search_text(self):
+        """Return the text covered by keyword search"""
+        return f"{self.title} {self.description} {self.mood} {self.dream_type} {self.symbols_text}"
+
+
+def parse_dream_line(line, dream_id=None):
+    """Parse a pipe-delimited dream line into a Dream (None if malformed)"""
+    parts = line.strip().split("|")
+    if len(parts) != len(DREAM_FIELDS):
+        return None
+    return Dream.from_text(*parts, dream_id=dream_id)
+
+
+def tokenize(text):
+    """Split text into lowercase search tokens"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def rank_matches(term_postings, total):
+    """Rank the dream ids matching every query term by tf-idf, best first
+
+    term_postings holds one list per query term of (dream id, term count,
+    document frequency) tuples; total is how many dreams were searched.
+    """
+    scores = None
+    for postings in term_postings:
+        term_scores = {}
+        for dream_id, count, frequency in postings:
+            term_scores[dream_id] = term_scores.get(dream_id, 0) + count * math.log(1 + total / frequency)
+
+        if scores is None:
+            scores = term_scores
+        else:
+            scores = {dream_id: score + term_scores[dream_id]
+                      for dream_id, score in scores.items() if dream_id in term_scores}
+        if not scores:
+            return []
+
+    return sorted(scores, key=lambda dream_id: (-scores[dream_id], dream_id))
+
+
+def summarize_counts(total, moods, types, symbols, intensities, top_symbols=10):
+    """Build a pattern statistics report from raw counts
+
+    moods, types and symbols map a value to how often it occurred, and
+    intensities maps an intensity (int) to how many dreams had it.
+    """
+    intensity_count = sum(intensities.values())
+    return {
+        'total': total,
+        'moods': sorted(moods.items(), key=lambda x: x[1], reverse=True),
+        'types': sorted(types.items(), key=lambda x: x[1], reverse=True),
+        'symbols': heapq.nlargest(top_symbols, symbols.items(), key=lambda x: x[1]),
+        'average_intensity': (sum(value * count for value, count in intensities.items()) / intensity_count
+                              if intensity_count else None),
+        'max_intensity': max(intensities) if intensities else None,
+        'min_intensity': min(intensities) if intensities else None
+    }
+
+
+def split_line_ranges(path, end, parts):
+    """Split the first end bytes of a file into up to parts ranges that break on line boundaries"""
+    if end <= 0:
+        return []
+    step = max(end // parts, 1)
+    boundaries = [0]
+    with map_file(path) as mapped:
+        for part in range(1, parts):
+            newline = mapped.find(b"\n", max(part * step, boundaries[-1]), end)
+            if newline == -1 or newline + 1 >= end:
+                break
+            boundaries.append(newline + 1)
+    boundaries.append(end)
+    return list(zip(boundaries, boundaries[1:]))
+
+
+def empty_dream_counts():
+    """Return the zeroed counters count_dream_range fills in"""
+    return {
+        'total': 0,
+        'users': set(),
+        'moods': Counter(),
+        'types': Counter(),
+        'symbols': Counter(),
+        'intensities': Counter()
+    }
+
+
+def count_dream_range(path, start, end, deleted=frozenset()):
+    """Count users, moods, types, symbols and intensities for the dream lines in a byte range"""
+    counts = empty_dream_counts()
+    with map_file(path) as mapped:
+        offset = start
+        while mapped is not None and offset < end:
+            line_end = mapped.find(b"\n", offset, end)
+            if line_end == -1:
+                break
+            dream = None if offset in deleted else parse_dream_line(mapped[offset:line_end].decode("utf-8", "replace"))
+            if dream:
+                counts['total'] += 1
+                counts['users'].add(dream.username)
+                counts['moods'][dream.mood.strip()] += 1
+                counts['types'][dream.dream_type.strip()] += 1
+                counts['symbols'].update(dream.symbols)
+                if dream.intensity is not None:
+                    counts['intensities'][dream.intensity] += 1
+            offset = line_end + 1
+    return counts
+
+
+def format_dream_line(dream):
+    """Format a Dream as a pipe-delimited line"""
+    fields = (dream.username, dream.date, dream.title, dream.description, dream.mood, dream.dream_type,
+              dream.intensity_text, dream.symbols_text)
+    return "|".join(fields) + "\n"
+
+
+def dream_fingerprint(dream):
+    """Return a checksum of a dream's contents, to tell when an id has come to point at another dream"""
+    return zlib.crc32(format_dream_line(dream).encode("utf-8"))
+
+
+def sync_file(file):
+    """Flush a file and, if SYNC_WRITES is on, force it to disk"""
+    file.flush()
+    if SYNC_WRITES:
+        os.fsync(file.fileno())
+
+
+def atomic_write(path, chunks):
+    """Replace a file with new contents through a synced temp file and rename"""
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as file:
+        file.writelines(chunks)
+        sync_file(file)
+    os.replace(temp_path, path)
+
+
+@contextlib.contextmanager
+def map_file(path):
+    """Memory-map a file read-only, yielding None when it is empty"""
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            yield None
+        else:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                yield mapped
+            finally:
+                mapped.close()
+
+
+def read_line_at(mapped, offset):
+    """Return the line of a mapped file starting at offset, including its newline"""
+    end = mapped.find(b"\n", offset)
+    return mapped[offset:] if end == -1 else mapped[offset:end + 1]
+
+
+lock_state = threading.local()  # File locks held by the current thread, see locked()
+
+
+@contextlib.contextmanager
+def locked(path):
+    """Hold an exclusive lock on a lock file for the duration of the block
+
+    The lock is reentrant within a thread, so a locked write path can call
+    helpers that take the same lock.
+    """
+    depths = lock_state.__dict__.setdefault('depths', {})
+    if depths.get(path):
+        depths[path] += 1
+        try:
+            yield
+        finally:
+            depths[path] -= 1
+        return
+
+    with open(path, "a+b") as lock_file:
+        if os.name == 'nt':
+            import msvcrt
+
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        depths[path] = 1
+        try:
+            yield
+        finally:
+            del depths[path]
+            if os.name == 'nt':
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def file_lock(path):
+    """Return the lock that serializes writes to path across processes"""
+    return locked(f"{path}.lock")
+
+
+def _apply_journal_entry(path, offset, data, truncate):
+    """Write data at offset in path, cutting the file after it if truncate is set"""
+    with open(path, "r+b" if os.path.exists(path) else "wb") as file:
+        file.seek(offset)
+        file.write(data)
+        if truncate:
+            file.truncate()
+        sync_file(file)
+
+
+def journal_write(path, offset, data, truncate=True):
+    """Write data at offset in path through a write-ahead journal
+
+    The journal entry is synced before the target file is touched, so after a
+    crash it is either incomplete (and the target untouched) or complete and
+    safe to replay, since replaying writes the same bytes at the same offset.
+    The target's file lock is held throughout, so writers in other processes
+    never share the journal or write over each other.
+    """
+    with file_lock(path):
+        _write_journaled(path, offset, data, truncate)
+
+
+def _write_journaled(path, offset, data, truncate):
+    """Write data at offset in path through the journal, the caller holding the file lock"""
+    journal_path = path + ".wal"
+    header = f"{offset} {len(data)} {zlib.crc32(data)} {int(truncate)}\n".encode("ascii")
+    with open(journal_path, "wb") as journal:
+        journal.write(header)
+        journal.write(data)
+        sync_file(journal)
+    _apply_journal_entry(path, offset, data, truncate)
+    os.remove(journal_path)
+
+
+def recover_journal(path):
+    """Replay or discard a journal entry left by an interrupted write, True if replayed"""
+    journal_path = path + ".wal"
+    if not os.path.exists(journal_path):
+        return False
+
+    # Under the lock a journal can only be left over from a writer that died
+    with file_lock(path):
+        try:
+            with open(journal_path, "rb") as journal:
+                header = journal.readline()
+                data = journal.read()
+        except FileNotFoundError:
+            return False
+
+        replayed = False
+        try:
+            offset, length, checksum, truncate = (int(value) for value in header.split())
+            if len(data) == length and zlib.crc32(data) == checksum:
+                _apply_journal_entry(path, offset, data, truncate)
+                replayed = True
+        except ValueError:
+            pass  # Torn header, the target was never touched
+        os.remove(journal_path)
+        return replayed
+
+
+def append_journaled(path, data):
+    """Append data to the end of path through the journal, returning its offset"""
+    with file_lock(path):
+        # The end of the file only stays the end while the lock is held
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            size = 0
+        if size:
+            with open(path, "rb") as file:
+                file.seek(size - 1)
+                if file.read(1) != b"\n":
+                    data = b"\n" + data  # Never glue a record onto a torn last line
+        _write_journaled(path, size, data, True)
+    return size
+
+
+def file_generation(path):
+    """Return the generation id of a data file, "" if it has never been rewritten"""
+    try:
+        with open(path + ".gen", "r", encoding="ascii") as file:
+            return file.read().strip()
+    except (FileNotFoundError, UnicodeDecodeError):
+        return ""
+
+
+def rewrite_file(path, chunks):
+    """Atomically replace a data file under a new generation id, the caller holding its file lock
+
+    Inodes freed by a rewrite are soon handed out again, so the generation id
+    is what tells the new file from one an index was built against.
+    """
+    atomic_write(path + ".gen", [os.urandom(8).hex().encode("ascii")])
+    atomic_write(path, chunks)
+
+
+class IndexedFile:
+    """Line-oriented data file with a persistent sidecar index
+
+    Records are identified by the byte offset of their line in the data file.
+    The index remembers how many bytes of the file it covers, so lines appended
+    since it was saved are indexed by scanning only the new tail, while a
+    rewritten, replaced or truncated file triggers a full rebuild. Which file
+    the index belongs to is told by its identity: the generation id that
+    rewrite_file changes, plus the device and inode.
+
+    Appends go through the write-ahead journal; inside batch() they are grouped
+    into one journal commit per GROUP_COMMIT_SIZE lines.
+    """
+
+    INDEX_VERSION = 1
+
+    def __init__(self, path, index_path):
+        self.path = path
+        self.index_path = index_path
+        self.loaded = False
+        self.dirty = False
+        self.pending = None  # Lines buffered by batch()
+        self._reset()
+
+    def _reset(self):
+        """Forget everything indexed so far"""
+        self.size = 0
+        self.identity = None
+
+    def _index_data(self):
+        """Return the subclass index contents to save"""
+        return {}
+
+    def _restore_index(self, data):
+        """Restore the subclass index contents from saved data"""
+
+    def _index_line(self, offset, line):
+        """Add one raw line to the index"""
+        raise NotImplementedError
+
+    def _load_index(self):
+        """Load the saved index, returning False if it is missing or unusable"""
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+            if data['version'] != self.INDEX_VERSION:
+                return False
+            self.size = data['size']
+            self.identity = data['identity']
+            self._restore_index(data)
+            return True
+        except (OSError, ValueError, KeyError, TypeError):
+            self._reset()
+            return False
+
+    def close(self):
+        """Persist the index before exit"""
+        self.save_index()
+
+    def save_index(self):
+        """Write the index to disk if it changed
+
+        Another session may have saved an index that reaches further into
+        the data file in the meantime; that one is kept rather than replaced
+        by this older view.
+        """
+        if not self.dirty:
+            return
+        data = {
+            'version': self.INDEX_VERSION,
+            'size': self.size,
+            'identity': self.identity
+        }
+        data.update(self._index_data())
+        temp_path = self.index_path + ".tmp"
+        try:
+            with file_lock(self.index_path):
+                if self._saved_index_is_newer(data):
+                    return
+                self._save_shards()
+                with open(temp_path, "w", encoding="utf-8") as file:
+                    file.write(json.dumps(data, separators=(",", ":")))
+                os.replace(temp_path, self.index_path)
+            self.dirty = False
+        except OSError:
+            pass
+
+    def _progress(self, data):
+        """Return how far through the data files an index reaches, as comparable numbers"""
+        return (data['size'],)
+
+    def _saved_index_is_newer(self, data):
+        """Return True if the saved index is for the same data file and reaches further than data"""
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as file:
+                saved = json.load(file)
+            if saved['version'] != self.INDEX_VERSION or saved['identity'] != self.identity:
+                return False
+            return any(theirs > ours for theirs, ours in zip(self._progress(saved), self._progress(data)))
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+
+    def _save_shards(self):
+        """Write any index parts kept outside the main index file, before the index itself"""
+
+    def _journaled_paths(self):
+        """Return the files this store writes through the journal"""
+        return [self.path]
+
+    def _identity(self, stat):
+        """Return the identity of the data file: its generation id, device and inode"""
+        return f"{file_generation(self.path)}:{stat.st_dev}:{stat.st_ino}"
+
+    def refresh(self):
+        """Bring the index up to date with the data file
+
+        Runs under the data file's lock, so the file cannot be rewritten
+        between reading its identity and indexing it.
+        """
+        if not self.loaded:
+            for path in self._journaled_paths():
+                recover_journal(path)
+            self._load_index()
+            self.loaded = True
+
+        with file_lock(self.path):
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                if self.size:
+                    self._reset()
+                    self.dirty = True
+                return
+
+            # A rewritten, replaced or truncated file invalidates every offset we know about
+            identity = self._identity(stat)
+            if identity != self.identity or stat.st_size < self.size:
+                self._reset()
+                self.identity = identity
+                self.dirty = True
+
+            if stat.st_size > self.size:
+                self._scan(self.size)
+
+    def _scan(self, start):
+        """Index complete lines from the start offset to the end of the file"""
+        offset = start
+        with map_file(self.path) as mapped:
+            # Let mmap.find locate line boundaries instead of Python-level line iteration
+            while mapped is not None:
+                end = mapped.find(b"\n", offset)
+                if end == -1:
+                    break  # Partially written line, pick it up next time
+                self._index_line(offset, mapped[offset:end + 1])
+                offset = end + 1
+        self.size = offset
+        self.dirty = True
+
+    def _append_line(self, data):
+        """Append one encoded line to the data file, or buffer it inside a batch"""
+        if self.pending is None:
+            self._commit_lines([data])
+            return
+        self.pending.append(data)
+        if len(self.pending) >= GROUP_COMMIT_SIZE:
+            self._commit_lines(self.pending)
+            self.pending = []
+
+    def _commit_lines(self, lines):
+        """Append encoded lines in a single journal commit and index them"""
+        self.refresh()
+        append_journaled(self.path, b"".join(lines))
+        self.refresh()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Group the appends made inside the block into as few journal commits as possible"""
+        self.pending = []
+        try:
+            yield self
+        finally:
+            pending, self.pending = self.pending, None
+            if pending:
+                self._commit_lines(pending)
+
+    def _rewrite(self, lines):
+        """Atomically replace the data file contents under a new generation and rebuild the index"""
+        with file_lock(self.path):
+            rewrite_file(self.path, lines)
+            self._reset()
+            self.refresh()
+
+
+class DreamStore(IndexedFile):
+    """Dream file storage indexed by user
+
+    The index is sharded by user. dreams.idx itself only records how far
+    through the data file and tombstone log the index reaches and who has
+    dreams; each user's dream offsets, dream ids sorted by date for range
+    queries and running pattern statistics live in a shard file of their
+    own under <index>.d/, with the user's inverted index of search tokens in
+    a second file beside it that is only read for searches and edits. Shards
+    are loaded the first time a user is touched and only changed ones are
+    written back, so an action costs as much as that user's journal rather
+    than everyone's.
+
+    Each shard records the data file size it was saved at; lines before it
+    are already in the shard, so a shard saved by another session is picked
+    up without indexing its lines twice.
+
+    Deleting a dream appends its id to a tombstone log instead of rewriting the
+    data file. The log starts with the identity of the data file it belongs to,
+    so a log left over from before a compaction is recognised and discarded.
+    Compaction rewrites the data file without the deleted lines once they make
+    up COMPACT_DELETED_RATIO of it.
+    """
+
+    INDEX_VERSION = 8
+
+    def __init__(self, path=DREAMS_FILE, index_path=DREAMS_INDEX_FILE, deleted_path=DREAMS_DELETED_FILE):
+        self.deleted_path = deleted_path
+        self.shards_dir = f"{index_path}.d"
+        super().__init__(path, index_path)
+
+    def _reset(self):
+        """Forget everything indexed so far"""
+        super()._reset()
+        self.shards = OrderedDict()  # username -> loaded shard, least recently used first
+        self.changed_shards = set()  # Users whose shard changed since it was saved
+        self.users = set()  # Users with dreams
+        self.rebuilt = True  # Indexing from scratch, so shards saved earlier cannot be trusted
+        self.deleted_size = 0  # Bytes of the tombstone log applied
+        self.deleted_bytes = 0  # Bytes of dreams.txt taken up by deleted lines
+
+    def _index_data(self):
+        """Return the dream index contents to save"""
+        return {
+            'users': sorted(self.users),
+            'deleted_size': self.deleted_size,
+            'deleted_bytes': self.deleted_bytes
+        }
+
+    def _restore_index(self, data):
+        """Restore the dream index contents from saved data"""
+        self.users = set(data['users'])
+        self.deleted_size = data['deleted_size']
+        self.deleted_bytes = data['deleted_bytes']
+        self.rebuilt = False
+
+    def _progress(self, data):
+        """Return how far through the data file and tombstone log an index reaches"""
+        return data['size'], data['deleted_size']
+
+    def _new_shard(self, covered=0):
+        """Return an empty shard, treating lines before covered as already indexed"""
+        return {
+            'offsets': [],
+            'tokens': {},  # token -> {dream id: term frequency}, None until loaded by _tokens
+            'date_keys': [],  # Date ordinals in ascending order (0 for unparseable dates)
+            'date_ids': [],  # Dream ids matching date_keys
+            'stats': {'total': 0, 'moods': {}, 'types': {}, 'symbols': {}, 'intensities': {}},
+            'covered': covered,
+            'vocabulary': None,  # Sorted tokens, built on demand for prefix search
+            'dates_sorted': True
+        }
+
+    def _shard_path(self, username, suffix=".json"):
+        """Return the path of a user's shard file, or with suffix ".tokens.json" of their token postings"""
+        import hashlib
+
+        return os.path.join(self.shards_dir, hashlib.sha256(username.encode("utf-8")).hexdigest()[:32] + suffix)
+
+    def _load_shard(self, username):
+        """Load a user's saved shard, returning None if it is missing or belongs to another data file"""
+        try:
+            with open(self._shard_path(username), "r", encoding="utf-8") as file:
+                data = json.load(file)
+            if (data['version'] != self.INDEX_VERSION or data['identity'] != self.identity
+                    or data['username'] != username):
+                return None
+            shard = self._new_shard(data['size'])
+            shard['offsets'] = data['offsets']
+            shard['tokens'] = None
+            shard['date_keys'] = data['date_keys']
+            shard['date_ids'] = data['date_ids']
+            shard['stats'] = data['stats']
+            return shard
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return None
+
+    def _tokens(self, shard, username):
+        """Return a shard's token postings, loading them on first use"""
+        if shard['tokens'] is not None:
+            return shard['tokens']
+        try:
+            with open(self._shard_path(username, ".tokens.json"), "r", encoding="utf-8") as file:
+                data = json.load(file)
+            if (data['version'] != self.INDEX_VERSION or data['identity'] != self.identity
+                    or data['size'] != shard['covered'] or data['username'] != username):
+                raise ValueError("token postings saved with another shard")
+            shard['tokens'] = {token: {int(dream_id): count for dream_id, count in postings.items()}
+                               for token, postings in data['tokens'].items()}
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            # Saved apart from the shard, so rebuild them from the user's dreams if they do not match
+            shard['tokens'] = {}
+            for dream in self._iter_at(shard['offsets'], username):
+                self._add_tokens(shard['tokens'], dream.id, dream)
+        return shard['tokens']
+
+    def _shard(self, username):
+        """Return a user's shard, loading it on first use"""
+        shard = self.shards.get(username)
+        if shard is not None:
+            self.shards.move_to_end(username)
+            return shard
+
+        shard = None if self.rebuilt else self._load_shard(username)
+        if shard is None and username in self.users:
+            shard = self._rebuild_shard(username)
+            self.changed_shards.add(username)
+        elif shard is None:
+            shard = self._new_shard()
+        elif shard['offsets']:
+            self.users.add(username)
+        self.shards[username] = shard
+
+        # Unchanged shards can always be loaded again, changed ones wait for save_index
+        unchanged = len(self.shards) - len(self.changed_shards) - (username not in self.changed_shards)
+        for name in list(self.shards) if unchanged > 0 and len(self.shards) > DREAMS_SHARD_CACHE_SIZE else ():
+            if len(self.shards) <= DREAMS_SHARD_CACHE_SIZE:
+                break
+            if name not in self.changed_shards and name != username:
+                del self.shards[name]
+        return shard
+
+    def _rebuild_shard(self, username):
+        """Rebuild a user's shard from the data file and tombstone log when its saved copy is lost"""
+        shard = self._new_shard()
+        prefix = f"{username}|".encode("utf-8")
+        with map_file(self.path) as mapped:
+            offset = 0
+            while mapped is not None and offset < self.size:
+                end = mapped.find(b"\n", offset)
+                if end == -1:
+                    break
+                if mapped[offset:offset + len(prefix)] == prefix:
+                    dream = self._read_at(mapped, offset)
+                    if dream and dream.username == username:
+                        self._add_dream(shard, offset, dream)
+                offset = end + 1
+            for dream_id in self._deleted_ids(self.deleted_size):
+                if dream_id < self.size:
+                    dream = self._read_at(mapped, dream_id)
+                    if dream and dream.username == username:
+                        self._remove_dream(shard, dream_id, dream)
+        return shard
+
+    def _save_shards(self):
+        """Write the changed shards, and after a rebuild remove shards of users with no dreams left"""
+        os.makedirs(self.shards_dir, exist_ok=True)
+        saved = set()
+        for username in self.changed_shards:
+            shard = self.shards[username]
+            self._sort_dates(shard)
+            header = {'version': self.INDEX_VERSION, 'identity': self.identity, 'size': self.size,
+                      'username': username}
+            parts = [(".json", dict(header, offsets=shard['offsets'], date_keys=shard['date_keys'],
+                                    date_ids=shard['date_ids'], stats=shard['stats']))]
+            if shard['tokens'] is not None:
+                parts.append((".tokens.json", dict(header, tokens=shard['tokens'])))
+            for suffix, data in parts:
+                path = self._shard_path(username, suffix)
+                with open(path + ".tmp", "w", encoding="utf-8") as file:
+                    file.write(json.dumps(data, separators=(",", ":")))
+                os.replace(path + ".tmp", path)
+                saved.add(os.path.basename(path))
+
+        if self.rebuilt:
+            for name in os.listdir(self.shards_dir):
+                if name not in saved:
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(os.path.join(self.shards_dir, name))
+        self.changed_shards.clear()
+        self.rebuilt = False
+
+    def _journaled_paths(self):
+        """Return the files this store writes through the journal"""
+        return [self.path, self.deleted_path]
+
+    def refresh(self):
+        """Bring the index up to date with the data file and tombstone log"""
+        # Compaction replaces both files under the data file's lock, so hold it for both
+        with file_lock(self.path):
+            super().refresh()
+            if not self._replay_deletions():
+                # The tombstone log shrank or vanished under us, start over
+                self._reset()
+                super().refresh()
+                self._replay_deletions()
+
+    def _owns_log(self, header):
+        """Return True if a tombstone log header names the data file the index is for"""
+        identity = header[1:].strip().decode("ascii", "replace")
+        if identity == self.identity:
+            return True
+        # Logs from before generation ids name only the inode of a never rewritten file
+        return identity.isdigit() and self.identity.startswith(":") and self.identity.endswith(f":{identity}")
+
+    def _replay_deletions(self):
+        """Apply tombstones appended since the last refresh, False if the log does not fit the index"""
+        try:
+            log_size = os.path.getsize(self.deleted_path)
+        except FileNotFoundError:
+            log_size = 0
+        if log_size < self.deleted_size:
+            return False
+        if log_size == self.deleted_size:
+            return True
+
+        with open(self.deleted_path, "rb") as log, open(self.path, "rb") as data:
+            header = log.readline()
+            if not header.endswith(b"\n"):
+                return self.deleted_size == 0  # Header still being written
+            if not header.startswith(b"@") or not self._owns_log(header):
+                log.close()
+                with file_lock(self.deleted_path):
+                    self._discard_deletion_log()
+                return True
+            self.deleted_size = max(self.deleted_size, len(header))
+            log.seek(self.deleted_size)
+            for entry in log:
+                if not entry.endswith(b"\n"):
+                    break  # Partially written entry, pick it up next time
+                try:
+                    dream_id = int(entry)
+                except ValueError:
+                    return False
+                data.seek(dream_id)
+                self._unindex_line(dream_id, data.readline())
+                self.deleted_size += len(entry)
+        self.dirty = True
+        return True
+
+    def _discard_deletion_log(self):
+        """Remove a tombstone log that belongs to a previous data file, holding both file locks"""
+        try:
+            os.remove(self.deleted_path)
+        except FileNotFoundError:
+            pass
+        self.deleted_size = 0
+
+    def _deleted_ids(self, end=None):
+        """Return the dream ids in the tombstone log, reading at most its first end bytes"""
+        try:
+            with open(self.deleted_path, "rb") as log:
+                entries = log.read() if end is None else log.read(end)
+        except FileNotFoundError:
+            return set()
+
+        deleted = set()
+        for entry in entries.split(b"\n")[:-1]:  # The last piece is empty or partially written
+            if entry.startswith(b"@"):
+                if not self._owns_log(entry):
+                    return set()
+            else:
+                deleted.add(int(entry))
+        return deleted
+
+    def _index_line(self, offset, line):
+        """Add one raw dream line to the index"""
+        dream = parse_dream_line(line.decode("utf-8", "replace"))
+        if not dream:
+            return
+        shard = self._shard(dream.username)
+        if offset < shard['covered']:
+            return  # Already in a shard saved by another session
+        self._add_dream(shard, offset, dream)
+        self.changed_shards.add(dream.username)
+        self.users.add(dream.username)
+
+    def _add_dream(self, shard, offset, dream):
+        """Add a dream to its user's shard"""
+        self._add_tokens(self._tokens(shard, dream.username), offset, dream)
+        shard['offsets'].append(offset)
+        shard['vocabulary'] = None
+
+        date_keys = shard['date_keys']
+        date_key = parse_date(dream.date) or 0
+        if date_keys and date_key < date_keys[-1]:
+            shard['dates_sorted'] = False
+        date_keys.append(date_key)
+        shard['date_ids'].append(offset)
+
+        self._update_stats(shard['stats'], dream, 1)
+
+    def _add_tokens(self, user_tokens, offset, dream):
+        """Add a dream's search tokens to a user's postings"""
+        for token in tokenize(dream.search_text()):
+            postings = user_tokens.setdefault(token, {})
+            postings[offset] = postings.get(offset, 0) + 1
+
+    def _sort_dates(self, shard):
+        """Sort a shard's date lists if they got out-of-order dates since they were last read"""
+        if shard['dates_sorted']:
+            return
+        # Sorting once on read keeps bulk appends linear instead of one list insert per line
+        pairs = sorted(zip(shard['date_keys'], shard['date_ids']))
+        shard['date_keys'] = [date for date, _ in pairs]
+        shard['date_ids'] = [dream_id for _, dream_id in pairs]
+        shard['dates_sorted'] = True
+
+    def _update_stats(self, stats, dream, change):
+        """Add (change=1) or remove (change=-1) a dream from its user's statistics"""
+        stats['total'] += change
+
+        keys = [('moods', dream.mood.strip()), ('types', dream.dream_type.strip())]
+        keys += [('symbols', symbol) for symbol in dream.symbols]
+        if dream.intensity is not None:
+            keys.append(('intensities', str(dream.intensity)))
+
+        for group, key in keys:
+            counts = stats[group]
+            counts[key] = counts.get(key, 0) + change
+            if counts[key] <= 0:
+                del counts[key]
+
+    def _unindex_line(self, offset, line):
+        """Remove one raw dream line from the index"""
+        dream = parse_dream_line(line.decode("utf-8", "replace"))
+        if not dream:
+            return
+        # Counted for every tombstone, since delete() never writes one twice
+        self.deleted_bytes += len(line)
+        if self._remove_dream(self._shard(dream.username), offset, dream):
+            self.changed_shards.add(dream.username)
+            self.dirty = True
+
+    def _remove_dream(self, shard, offset, dream):
+        """Remove a dream from its user's shard, False if it is not there"""
+        offsets = shard['offsets']
+        position = bisect.bisect_left(offsets, offset)
+        if position == len(offsets) or offsets[position] != offset:
+            return False
+        del offsets[position]
+
+        user_tokens = self._tokens(shard, dream.username)
+        for token in set(tokenize(dream.search_text())):
+            postings = user_tokens.get(token, {})
+            postings.pop(offset, None)
+            if not postings:
+                user_tokens.pop(token, None)
+        shard['vocabulary'] = None
+
+        self._sort_dates(shard)
+        date_keys = shard['date_keys']
+        date_ids = shard['date_ids']
+        position = bisect.bisect_left(date_keys, parse_date(dream.date) or 0)
+        while date_ids[position] != offset:
+            position += 1
+        del date_keys[position]
+        del date_ids[position]
+
+        self._update_stats(shard['stats'], dream, -1)
+        return True
+
+    def _read_at(self, mapped, offset):
+        """Parse the dream line starting at offset in the mapped data file"""
+        return parse_dream_line(read_line_at(mapped, offset).decode("utf-8", "replace"), offset)
+
+    def iter_user_dreams(self, username, predicate=None):
+        """Lazily yield one user's dreams (optionally only those matching predicate), reading only their lines"""
+        self.refresh()
+        offsets = tuple(self._shard(username)['offsets'])
+        for dream in self._iter_at(offsets, username):
+            if predicate is None or predicate(dream):
+                yield dream
+
+    def page(self, username, start, size):
+        """Return `size` of a user's dreams starting at the 0-based position `start`"""
+        self.refresh()
+        return list(self._iter_at(self._shard(username)['offsets'][start:start + size], username))
+
+    def get_user_dreams(self, username):
+        """Load one user's dreams, reading only that user's lines"""
+        return list(self.iter_user_dreams(username))
+
+    def _matching_tokens(self, shard, user_tokens, token, prefix):
+        """Return the indexed tokens that match a query token"""
+        if not prefix:
+            return [token] if token in user_tokens else []
+
+        vocabulary = shard['vocabulary']
+        if vocabulary is None:
+            vocabulary = sorted(user_tokens)
+            shard['vocabulary'] = vocabulary
+        start = bisect.bisect_left(vocabulary, token)
+        end = bisect.bisect_left(vocabulary, token + "\U0010ffff")
+        return vocabulary[start:end]
+
+    def search(self, username, query, prefix=False):
+        """Lazily yield a user's dreams containing every query token, best matches first"""
+        self.refresh()
+        query_tokens = tokenize(query)
+        shard = self._shard(username)
+        if not query_tokens or not shard['offsets']:
+            return iter(())
+        user_tokens = self._tokens(shard, username)
+        if not user_tokens:
+            return iter(())
+
+        term_postings = []
+        for query_token in set(query_tokens):
+            term_postings.append([
+                (dream_id, count, len(user_tokens[token]))
+                for token in self._matching_tokens(shard, user_tokens, query_token, prefix)
+                for dream_id, count in user_tokens[token].items()
+            ])
+        ranked = rank_matches(term_postings, len(shard['offsets']))
+        return self._iter_at(ranked, username)
+
+    def _iter_at(self, dream_ids, username=None):
+        """Lazily read the dreams with the given ids (only username's, if given), in that order
+
+        Records are sliced straight out of a memory map of the data file, so
+        only the requested lines are copied and decoded. The file is read
+        without its lock, so a compaction in between can move other lines
+        under an id; the username check keeps those from ever being shown.
+        """
+        if not dream_ids:
+            return
+        with map_file(self.path) as mapped:
+            for dream_id in dream_ids:
+                dream = self._read_at(mapped, dream_id) if mapped is not None else None
+                if dream and (username is None or dream.username == username):
+                    yield dream
+
+    def usernames(self):
+        """Return the users who have dreams"""
+        self.refresh()
+        return sorted(self.users)
+
+    def count(self, username):
+        """Return how many dreams a user has"""
+        self.refresh()
+        return len(self._shard(username)['offsets'])
+
+    def _date_slice(self, shard, start_date, end_date):
+        """Return index bounds of the shard's dreams dated within the range"""
+        start_date, end_date = date_range(start_date, end_date)
+        self._sort_dates(shard)
+        date_keys = shard['date_keys']
+        return (bisect.bisect_left(date_keys, parse_date(start_date)),
+                bisect.bisect_right(date_keys, parse_date(end_date)))
+
+    def count_between(self, username, start_date, end_date):
+        """Count a user's dreams dated from start_date to end_date inclusive"""
+        self.refresh()
+        start, end = self._date_slice(self._shard(username), start_date, end_date)
+        return max(end - start, 0)
+
+    def iter_between(self, username, start_date, end_date):
+        """Lazily yield a user's dreams dated from start_date to end_date, oldest first"""
+        self.refresh()
+        shard = self._shard(username)
+        start, end = self._date_slice(shard, start_date, end_date)
+        dream_ids = shard['date_ids'][start:end]
+        yield from self._iter_at(dream_ids, username)
+
+    def pattern_stats(self, username, top_symbols=10):
+        """Return a user's pattern statistics from the running counts"""
+        self.refresh()
+        stats = self._shard(username)['stats']
+        if not stats['total']:
+            return None
+
+        intensities = {int(value): count for value, count in stats['intensities'].items()}
+        return summarize_counts(stats['total'], stats['moods'], stats['types'], stats['symbols'], intensities,
+                                top_symbols)
+
+    def corpus_stats(self, workers=None, top_symbols=10):
+        """Return statistics across every user's dreams, counted in parallel byte ranges
+
+        The data file is split on line boundaries into several ranges per
+        worker; each range is counted in a separate process and the partial
+        counters are merged. Small files are counted in-process.
+        """
+        self.refresh()
+        workers = workers or os.cpu_count() or 1
+        if self.size < PARALLEL_STATS_MIN_BYTES:
+            workers = 1
+        ranges = split_line_ranges(self.path, self.size, workers * 4)
+        if not ranges:
+            return None
+
+        all_deleted = self._deleted_ids(self.deleted_size)
+        paths = [self.path] * len(ranges)
+        starts = [start for start, end in ranges]
+        ends = [end for start, end in ranges]
+        deleted = [frozenset(dream_id for dream_id in all_deleted if start <= dream_id < end)
+                   for start, end in ranges]
+        if workers == 1:
+            partials = map(count_dream_range, paths, starts, ends, deleted)
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                partials = list(executor.map(count_dream_range, paths, starts, ends, deleted))
+
+        merged = empty_dream_counts()
+        for partial in partials:
+            merged['total'] += partial['total']
+            merged['users'] |= partial['users']
+            for group in ('moods', 'types', 'symbols', 'intensities'):
+                merged[group].update(partial[group])
+        if not merged['total']:
+            return None
+
+        stats = summarize_counts(merged['total'], merged['moods'], merged['types'], merged['symbols'],
+                                 merged['intensities'], top_symbols)
+        stats['users'] = len(merged['users'])
+        return stats
+
+    def dream_number(self, username, dream_id):
+        """Return the 1-based position of a dream in the user's journal"""
+        return bisect.bisect_left(self._shard(username)['offsets'], dream_id) + 1
+
+    def get_dream(self, username, dream_id):
+        """Return one of a user's dreams by id, or None if the user has no such dream"""
+        self.refresh()
+        offsets = self._shard(username)['offsets']
+        position = bisect.bisect_left(offsets, dream_id)
+        if position == len(offsets) or offsets[position] != dream_id:
+            return None
+        return next(self._iter_at([dream_id], username), None)
+
+    def append(self, dream):
+        """Append a dream to the data file and index it"""
+        self._append_line(format_dream_line(dream).encode("utf-8"))
+
+    def append_many(self, dreams):
+        """Append many dreams with group commit"""
+        with self.batch():
+            for dream in dreams:
+                self.append(dream)
+
+    def _live_dream(self, dream_id):
+        """Return the indexed, undeleted dream whose line starts at dream_id, or None"""
+        if not 0 <= dream_id < self.size:
+            return None
+        with map_file(self.path) as mapped:
+            dream = self._read_at(mapped, dream_id) if mapped is not None else None
+        if not dream:
+            return None
+        return self.get_dream(dream.username, dream_id)
+
+    def delete(self, dream_id, fingerprint=None):
+        """Delete a dream by appending a tombstone, compacting when enough have piled up
+
+        With a fingerprint the dream is only deleted if its dream_fingerprint
+        still matches, since ids move when the data file is compacted.
+        """
+        self.refresh()
+        identity = self.identity
+        # Data file then tombstone log, the order compaction takes them in
+        with file_lock(self.path), file_lock(self.deleted_path):
+            self.refresh()
+            stale = self.identity != identity
+            dream = None if stale else self._live_dream(dream_id)
+            if not dream or (fingerprint is not None and dream_fingerprint(dream) != fingerprint):
+                return False
+
+            entry = f"{dream_id}\n".encode("ascii")
+            if not os.path.exists(self.deleted_path):
+                entry = f"@{self.identity}\n".encode("ascii") + entry
+            append_journaled(self.deleted_path, entry)
+            self.refresh()
+
+        if self.deleted_bytes >= self.size * COMPACT_DELETED_RATIO:
+            self.compact()
+        return True
+
+    def compact(self):
+        """Rewrite the data file without deleted lines, returning how many were dropped"""
+        self.refresh()
+        # Always data file then tombstone log, so compactions and deletes cannot deadlock
+        with file_lock(self.path), file_lock(self.deleted_path):
+            self.refresh()
+            deleted = self._deleted_ids()
+            if not deleted:
+                return 0
+
+            def kept_lines(source):
+                offset = 0
+                for line in source:
+                    if offset not in deleted:
+                        yield line
+                    offset += len(line)
+
+            with open(self.path, "rb") as source:
+                rewrite_file(self.path, kept_lines(source))
+            self._discard_deletion_log()
+
+            self._reset()
+            self.refresh()
+        return len(deleted)
+
+
+def username_key(username):
+    """Return the case-insensitive index key for a username without storing it in clear"""
+    import hashlib
+
+    return hashlib.sha256(username.lower().encode("utf-8")).hexdigest()[:32]
+
+
+def format_user_line(username, password_hash, full_name):
+    """Encrypt a user record as a line of the user file"""
+    return (encrypt_data(f"{username}|{password_hash}|{full_name}") + "\n").encode("ascii")
+
+
+class UserDirectory(IndexedFile):
+    """Encrypted user file indexed by username
+
+    Each line is decrypted once when it is indexed; lookups afterwards seek
+    straight to the matching record and decrypt only that line.
+    """
+
+    INDEX_VERSION = 2
+
+    def __init__(self, path=USERS_FILE, index_path=USERS_INDEX_FILE):
+        super().__init__(path, index_path)
+
+    def _reset(self):
+        """Forget everything indexed so far"""
+        super()._reset()
+        self.offsets = {}  # username_key -> record offset
+
+    def _index_data(self):
+        """Return the user index contents to save"""
+        return {'users': self.offsets}
+
+    def _restore_index(self, data):
+        """Restore the user index contents from saved data"""
+        self.offsets = data['users']
+
+    def _parse(self, line):
+        """Decrypt a raw user line into a record dict (None if unreadable)"""
+        decrypted_data = decrypt_data(line.decode("ascii", "replace").strip())
+        if not decrypted_data:
+            return None
+        parts = decrypted_data.split("|")
+        if len(parts) != 3:
+            return None
+        return dict(zip(('username', 'password', 'full_name'), parts))
+
+    def _index_line(self, offset, line):
+        """Add one raw user line to the index"""
+        user = self._parse(line)
+        if user:
+            # The first record for a username wins, as with the old linear scan
+            self.offsets.setdefault(username_key(user['username']), offset)
+
+    def count(self):
+        """Return how many users are registered"""
+        self.refresh()
+        return len(self.offsets)
+
+    def find(self, username):
+        """Return the record for a username (case-insensitive) or None"""
+        self.refresh()
+        offset = self.offsets.get(username_key(username))
+        if offset is None:
+            return None
+
+        with open(self.path, "rb") as file:
+            file.seek(offset)
+            user = self._parse(file.readline())
+        if not user or user['username'].lower() != username.lower():
+            return None
+        user['id'] = offset
+        return user
+
+    def iter_users(self):
+        """Yield every indexed user record in file order"""
+        self.refresh()
+        with open(self.path, "rb") as file:
+            for offset in sorted(self.offsets.values()):
+                file.seek(offset)
+                user = self._parse(file.readline())
+                if user:
+                    user['id'] = offset
+                    yield user
+
+    def add(self, username, password_hash, full_name):
+        """Append a new user record, returning False if the username is already taken"""
+        with file_lock(self.path):
+            # Checked under the lock so two sessions cannot register the same username
+            if self.find(username):
+                return False
+            self._append_line(format_user_line(username, password_hash, full_name))
+        return True
+
+    def update_password(self, username, password_hash):
+        """Replace a user's password hash, returning False if the user is unknown"""
+        self.refresh()
+        with file_lock(self.path):
+            # Held across the read and the rewrite so registrations in other processes are not lost
+            user = self.find(username)
+            if not user:
+                return False
+
+            new_line = format_user_line(user['username'], password_hash, user['full_name'])
+            with open(self.path, "rb") as file:
+                file.seek(user['id'])
+                same_length = len(file.readline()) == len(new_line)
+                file.seek(0)
+                lines = [] if same_length else file.readlines()
+
+            if same_length:
+                # Same length record, overwrite it where it is
+                journal_write(self.path, user['id'], new_line, truncate=False)
+                return True
+
+            new_lines = []
+            offset = 0
+            for line in lines:
+                new_lines.append(new_line if offset == user['id'] else line)
+                offset += len(line)
+            self._rewrite(new_lines)
+        return True
+
+
+def read_legacy_prompt_files(username):
+    """Yield (file name, created, answers) for a user's old one-file-per-session prompt answers"""
+    import glob
+
+    for filename in sorted(glob.glob(f"dream_prompts_{username}_*.txt")):
+        match = LEGACY_PROMPT_FILE_PATTERN.fullmatch(os.path.basename(filename))
+        if not match or match.group(1) != username:
+            continue  # Another user whose name starts with this one
+        created = f"{match.group(2)} {match.group(3)}:{match.group(4)}:{match.group(5)}"
+        answers = []
+        question = None
+        try:
+            with open(filename, "r", encoding="utf-8") as file:
+                for line in file:
+                    line = line.rstrip("\n")
+                    if line.startswith("Dream Recall Session - "):
+                        created = line[len("Dream Recall Session - "):].strip() or created
+                    elif line.startswith("Q: "):
+                        question = line[3:]
+                    elif line.startswith("A: ") and question is not None:
+                        answers.append([question, line[3:]])
+                        question = None
+        except (OSError, UnicodeDecodeError):
+            continue
+        yield filename, created, answers
+
+
+class PromptSessionStore(IndexedFile):
+    """Dream recall sessions in one append-only file indexed by user
+
+    The index keeps each user's (offset, created) pairs, so listing
+    sessions needs no reads and opening one is a single seek. Old
+    dream_prompts_<user>_<timestamp>.txt files are copied in the first time
+    a user's sessions are listed; the files themselves are left alone.
+    """
+
+    INDEX_VERSION = 2
+
+    def __init__(self, path=PROMPT_SESSIONS_FILE, index_path=PROMPT_SESSIONS_INDEX_FILE):
+        super().__init__(path, index_path)
+
+    def _reset(self):
+        """Forget everything indexed so far"""
+        super()._reset()
+        self.user_sessions = {}  # username -> [[offset, created], ...] in file order
+        self.legacy_imported = set()  # Users whose old prompt files have been copied in
+
+    def _index_data(self):
+        """Return the session index contents to save"""
+        return {'sessions': self.user_sessions, 'legacy_imported': sorted(self.legacy_imported)}
+
+    def _restore_index(self, data):
+        """Restore the session index contents from saved data"""
+        self.user_sessions = data['sessions']
+        self.legacy_imported = set(data['legacy_imported'])
+
+    def _index_line(self, offset, line):
+        """Add one raw session line to the index"""
+        try:
+            record = json.loads(line)
+            username = record['username']
+        except (ValueError, KeyError, TypeError):
+            return
+        if 'legacy_files' in record:
+            self.legacy_imported.add(username)
+        else:
+            self.user_sessions.setdefault(username, []).append([offset, record.get('created', "")])
+
+    def _encode(self, record):
+        """Encode a record as one JSON line"""
+        return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+    def add(self, username, answers, created=None):
+        """Append a session of [question, answer] pairs"""
+        created = created or current_time("%Y-%m-%d %H:%M:%S")
+        self._append_line(self._encode({'username': username, 'created': created, 'answers': answers}))
+
+    def import_legacy(self, username):
+        """Copy a user's old prompt files in, once"""
+        self.refresh()
+        if username in self.legacy_imported:
+            return
+        legacy_files = []
+        with self.batch():
+            for filename, created, answers in read_legacy_prompt_files(username):
+                self.add(username, answers, created)
+                legacy_files.append(filename)
+            self._append_line(self._encode({'username': username, 'legacy_files': legacy_files}))
+
+    def sessions(self, username):
+        """Return a user's (session id, created) pairs, newest first"""
+        self.import_legacy(username)
+        return sorted((tuple(session) for session in self.user_sessions.get(username, [])),
+                      key=lambda session: (session[1], session[0]), reverse=True)
+
+    def read(self, session_id):
+        """Return a session as a dict with username, created and answers (None if unreadable)"""
+        self.refresh()
+        with open(self.path, "rb") as file:
+            file.seek(session_id)
+            line = file.readline()
+        try:
+            return json.loads(line)
+        except ValueError:
+            return None
+
+    def iter_all(self):
+        """Yield every session record, and the legacy import markers, in file order"""
+        self.refresh()
+        try:
+            file = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+class SymbolFile:
+    """Custom symbols stored as "Symbol: meaning" lines
+
+    The parsed symbols are cached and only re-read when the file's mtime or
+    size changes; version goes up whenever the cached symbols change.
+    """
+
+    def __init__(self, path=CUSTOM_SYMBOLS_FILE):
+        self.path = path
+        self.symbols = None
+        self.signature = None
+        self.version = 0
+
+    def _signature(self):
+        """Return the (mtime, size) used to notice changes to the file, None if it is missing"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self):
+        """Return custom symbols as a lowercase symbol -> meaning dict (shared, do not modify)"""
+        signature = self._signature()
+        if self.symbols is not None and signature == self.signature:
+            return self.symbols
+
+        custom_symbols = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                for line in file:
+                    line = line.strip()
+                    if ':' in line:
+                        symbol, meaning = line.split(':', 1)
+                        custom_symbols[symbol.strip().lower()] = meaning.strip()
+        except FileNotFoundError:
+            pass
+        self.symbols = custom_symbols
+        self.signature = signature
+        self.version += 1
+        return custom_symbols
+
+    def add(self, symbol, meaning):
+        """Append a custom symbol"""
+        custom_symbols = self.load()
+        with file_lock(self.path):
+            signature = self._signature()
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write(f"{symbol.capitalize()}: {meaning}\n")
+            if signature != self.signature:
+                # Another session added symbols since load(), re-read them all next time
+                self.symbols = None
+                return
+            custom_symbols[symbol.strip().lower()] = meaning.strip()
+            self.signature = self._signature()
+        self.version += 1
+
+    def close(self):
+        """Nothing to persist, writes go straight to the file"""
+
+
+class SqliteDatabase:
+    """Shared SQLite connection and schema for the sqlite storage backend"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS dreams (
+            id INTEGER PRIMARY KEY,
+            username TEXT NOT NULL,
+            date TEXT NOT NULL,
+            title TEXT NOT NULL,
+            description TEXT NOT NULL,
+            mood TEXT NOT NULL,
+            dream_type TEXT NOT NULL,
+            intensity INTEGER,
+            symbols TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS dreams_username_date ON dreams (username, date);
+        CREATE INDEX IF NOT EXISTS dreams_username_mood ON dreams (username, mood);
+        CREATE TABLE IF NOT EXISTS dream_symbols (
+            dream_id INTEGER NOT NULL,
+            username TEXT NOT NULL,
+            symbol TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS dream_symbols_username_symbol ON dream_symbols (username, symbol);
+        CREATE INDEX IF NOT EXISTS dream_symbols_dream ON dream_symbols (dream_id);
+        CREATE TABLE IF NOT EXISTS dream_tokens (
+            dream_id INTEGER NOT NULL,
+            username TEXT NOT NULL,
+            token TEXT NOT NULL,
+            count INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS dream_tokens_username_token ON dream_tokens (username, token);
+        CREATE INDEX IF NOT EXISTS dream_tokens_dream ON dream_tokens (dream_id);
+        CREATE TABLE IF NOT EXISTS users (
+            username_key TEXT PRIMARY KEY,
+            username TEXT NOT NULL,
+            password TEXT NOT NULL,
+            full_name TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS custom_symbols (
+            id INTEGER PRIMARY KEY,
+            symbol TEXT NOT NULL,
+            meaning TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS prompt_sessions (
+            id INTEGER PRIMARY KEY,
+            username TEXT NOT NULL,
+            created TEXT NOT NULL,
+            answers TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS prompt_sessions_username_created ON prompt_sessions (username, created);
+        CREATE TABLE IF NOT EXISTS legacy_prompt_imports (
+            username TEXT PRIMARY KEY
+        );
+    """
+
+    def __init__(self, path=DATABASE_FILE):
+        import sqlite3
+
+        self.path = path
+        # Server mode uses the connection from worker threads, one at a time under JournalServer.lock
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.executescript(self.SCHEMA)
+
+    def close(self):
+        """Commit and close the connection"""
+        self.connection.commit()
+        self.connection.close()
+
+
+class SqliteDreamStore:
+    """Dream storage in SQLite, with search, date filters and statistics done in SQL"""
+
+    COLUMNS = "id, username, date, title, description, mood, dream_type, intensity, symbols"
+
+    def __init__(self, database):
+        self.database = database
+        self.connection = database.connection
+
+    def _to_dream(self, row):
+        """Convert a dreams row into a Dream"""
+        dream_id, username, date, title, description, mood, dream_type, intensity, symbols = row
+        if not isinstance(intensity, int):
+            intensity = None
+        symbols = tuple(symbol.strip() for symbol in symbols.split(",") if symbol.strip())
+        return Dream(username, date, title, description, mood, dream_type, intensity, symbols, dream_id)
+
+    def _insert(self, dream):
+        """Insert a dream with its symbol and token rows (caller commits)"""
+        cursor = self.connection.execute(
+            "INSERT INTO dreams (username, date, title, description, mood, dream_type, intensity, symbols) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (dream.username, dream.date, dream.title, dream.description,
+             dream.mood, dream.dream_type, dream.intensity, dream.symbols_text))
+        dream_id = cursor.lastrowid
+
+        self.connection.executemany(
+            "INSERT INTO dream_symbols (dream_id, username, symbol) VALUES (?, ?, ?)",
+            [(dream_id, dream.username, symbol) for symbol in dream.symbols])
+
+        token_counts = {}
+        for token in tokenize(dream.search_text()):
+            token_counts[token] = token_counts.get(token, 0) + 1
+        self.connection.executemany(
+            "INSERT INTO dream_tokens (dream_id, username, token, count) VALUES (?, ?, ?, ?)",
+            [(dream_id, dream.username, token, count) for token, count in token_counts.items()])
+
+    def append(self, dream):
+        """Insert a dream"""
+        with self.connection:
+            self._insert(dream)
+
+    def append_many(self, dreams):
+        """Insert many dreams in one transaction"""
+        with self.connection:
+            for dream in dreams:
+                self._insert(dream)
+
+    def delete(self, dream_id, fingerprint=None):
+        """Delete a dream, returning False if it does not exist or no longer matches fingerprint"""
+        with self.connection:
+            if fingerprint is not None:
+                self.connection.execute("BEGIN IMMEDIATE")  # Nobody can change the row between check and delete
+                row = self.connection.execute(f"SELECT {self.COLUMNS} FROM dreams WHERE id = ?", (dream_id,)).fetchone()
+                if not row or dream_fingerprint(self._to_dream(row)) != fingerprint:
+                    return False
+            cursor = self.connection.execute("DELETE FROM dreams WHERE id = ?", (dream_id,))
+            self.connection.execute("DELETE FROM dream_symbols WHERE dream_id = ?", (dream_id,))
+            self.connection.execute("DELETE FROM dream_tokens WHERE dream_id = ?", (dream_id,))
+        return cursor.rowcount > 0
+
+    def iter_user_dreams(self, username, predicate=None):
+        """Lazily yield one user's dreams (optionally only those matching predicate) in the order they were added"""
+        rows = self.connection.execute(
+            f"SELECT {self.COLUMNS} FROM dreams WHERE username = ? ORDER BY id", (username,))
+        for row in rows:
+            dream = self._to_dream(row)
+            if predicate is None or predicate(dream):
+                yield dream
+
+    def page(self, username, start, size):
+        """Return `size` of a user's dreams starting at the 0-based position `start`"""
+        rows = self.connection.execute(
+            f"SELECT {self.COLUMNS} FROM dreams WHERE username = ? ORDER BY id LIMIT ? OFFSET ?",
+            (username, size, start))
+        return [self._to_dream(row) for row in rows]
+
+    def get_user_dreams(self, username):
+        """Load one user's dreams in the order they were added"""
+        return list(self.iter_user_dreams(username))
+
+    def usernames(self):
+        """Return the users who have at least one dream"""
+        return [row[0] for row in self.connection.execute("SELECT DISTINCT username FROM dreams ORDER BY username")]
+
+    def count(self, username):
+        """Return how many dreams a user has"""
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM dreams WHERE username = ?", (username,)).fetchone()[0]
+
+    def dream_number(self, username, dream_id):
+        """Return the 1-based position of a dream in the user's journal"""
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM dreams WHERE username = ? AND id < ?", (username, dream_id)).fetchone()[0] + 1
+
+    def get_dream(self, username, dream_id):
+        """Return one of a user's dreams by id, or None if the user has no such dream"""
+        row = self.connection.execute(
+            f"SELECT {self.COLUMNS} FROM dreams WHERE id = ? AND username = ?", (dream_id, username)).fetchone()
+        return self._to_dream(row) if row else None
+
+    def count_between(self, username, start_date, end_date):
+        """Count a user's dreams dated from start_date to end_date inclusive"""
+        start_date, end_date = date_range(start_date, end_date)
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM dreams WHERE username = ? AND date BETWEEN ? AND ?",
+            (username, start_date, end_date)).fetchone()[0]
+
+    def iter_between(self, username, start_date, end_date):
+        """Lazily yield a user's dreams dated from start_date to end_date, oldest first"""
+        start_date, end_date = date_range(start_date, end_date)
+        rows = self.connection.execute(
+            f"SELECT {self.COLUMNS} FROM dreams WHERE username = ? AND date BETWEEN ? AND ? ORDER BY date, id",
+            (username, start_date, end_date))
+        for row in rows:
+            yield self._to_dream(row)
+
+    def search(self, username, query, prefix=False):
+        """Lazily yield a user's dreams containing every query token, best matches first"""
+        query_tokens = tokenize(query)
+        if not query_tokens:
+            return
+
+        term_postings = []
+        for query_token in set(query_tokens):
+            if prefix:
+                condition, parameters = "token >= ? AND token < ?", (query_token, query_token + "\U0010ffff")
+            else:
+                condition, parameters = "token = ?", (query_token,)
+            term_postings.append(self.connection.execute(
+                "SELECT dream_id, count, COUNT(*) OVER (PARTITION BY token) FROM dream_tokens "
+                f"WHERE username = ? AND {condition}", (username,) + parameters).fetchall())
+        ranked = rank_matches(term_postings, self.count(username))
+
+        for start in range(0, len(ranked), 500):
+            chunk = ranked[start:start + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            rows = self.connection.execute(
+                f"SELECT {self.COLUMNS} FROM dreams WHERE id IN ({placeholders})", chunk)
+            dreams = {row[0]: self._to_dream(row) for row in rows}
+            for dream_id in chunk:
+                if dream_id in dreams:
+                    yield dreams[dream_id]
+
+    def _grouped_stats(self, condition, parameters, top_symbols):
+        """Compute pattern statistics for the dreams matching a WHERE condition"""
+        total = self.connection.execute(
+            f"SELECT COUNT(*) FROM dreams WHERE {condition}", parameters).fetchone()[0]
+        if not total:
+            return None
+
+        def grouped(table, column, limit=-1):
+            return self.connection.execute(
+                f"SELECT TRIM({column}) AS value, COUNT(*) AS times FROM {table} WHERE {condition} "
+                f"GROUP BY value ORDER BY times DESC, MIN(rowid) LIMIT ?", parameters + (limit,)).fetchall()
+
+        average, highest, lowest = self.connection.execute(
+            "SELECT AVG(intensity), MAX(intensity), MIN(intensity) FROM dreams "
+            f"WHERE {condition} AND typeof(intensity) = 'integer'", parameters).fetchone()
+        return {
+            'total': total,
+            'moods': grouped("dreams", "mood"),
+            'types': grouped("dreams", "dream_type"),
+            'symbols': grouped("dream_symbols", "symbol", top_symbols),
+            'average_intensity': average,
+            'max_intensity': highest,
+            'min_intensity': lowest
+        }
+
+    def pattern_stats(self, username, top_symbols=10):
+        """Return a user's pattern statistics computed by grouped queries"""
+        return self._grouped_stats("username = ?", (username,), top_symbols)
+
+    def corpus_stats(self, workers=None, top_symbols=10):
+        """Return statistics across every user's dreams (SQLite aggregates, workers is unused)"""
+        stats = self._grouped_stats("1", (), top_symbols)
+        if stats:
+            stats['users'] = self.connection.execute("SELECT COUNT(DISTINCT username) FROM dreams").fetchone()[0]
+        return stats
+
+    def close(self):
+        """Nothing to persist beyond the shared connection"""
+
+
+class SqliteUserDirectory:
+    """User records in SQLite keyed by lowercased username"""
+
+    def __init__(self, database):
+        self.database = database
+        self.connection = database.connection
+
+    def count(self):
+        """Return how many users are registered"""
+        return self.connection.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def find(self, username):
+        """Return the record for a username (case-insensitive) or None"""
+        row = self.connection.execute(
+            "SELECT username, password, full_name FROM users WHERE username_key = ?",
+            (username_key(username),)).fetchone()
+        if not row:
+            return None
+        return dict(zip(('username', 'password', 'full_name'), row))
+
+    def add(self, username, password_hash, full_name):
+        """Insert a new user record, returning False if the username is already taken"""
+        import sqlite3
+
+        try:
+            with self.connection:
+                self.connection.execute(
+                    "INSERT INTO users (username_key, username, password, full_name) VALUES (?, ?, ?, ?)",
+                    (username_key(username), username, password_hash, full_name))
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def update_password(self, username, password_hash):
+        """Replace a user's password hash, returning False if the user is unknown"""
+        with self.connection:
+            cursor = self.connection.execute(
+                "UPDATE users SET password = ? WHERE username_key = ?", (password_hash, username_key(username)))
+        return cursor.rowcount > 0
+
+    def close(self):
+        """Nothing to persist beyond the shared connection"""
+
+
+class SqliteSymbolTable:
+    """Custom symbols stored in SQLite
+
+    The symbols are cached until PRAGMA data_version shows another
+    connection has committed; version goes up whenever the cache changes.
+    """
+
+    def __init__(self, database):
+        self.database = database
+        self.connection = database.connection
+        self.symbols = None
+        self.data_version = None
+        self.version = 0
+
+    def load(self):
+        """Return custom symbols as a lowercase symbol -> meaning dict (shared, do not modify)"""
+        data_version = self.connection.execute("PRAGMA data_version").fetchone()[0]
+        if self.symbols is not None and data_version == self.data_version:
+            return self.symbols
+
+        rows = self.connection.execute("SELECT symbol, meaning FROM custom_symbols ORDER BY id")
+        self.symbols = {symbol.strip().lower(): meaning.strip() for symbol, meaning in rows}
+        self.data_version = data_version
+        self.version += 1
+        return self.symbols
+
+    def add(self, symbol, meaning):
+        """Insert a custom symbol"""
+        custom_symbols = self.load()
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO custom_symbols (symbol, meaning) VALUES (?, ?)", (symbol.capitalize(), meaning))
+        custom_symbols[symbol.strip().lower()] = meaning.strip()
+        self.version += 1
+
+    def close(self):
+        """Nothing to persist beyond the shared connection"""
+
+
+class SqlitePromptSessionStore:
+    """Dream recall sessions stored in SQLite"""
+
+    def __init__(self, database):
+        self.database = database
+        self.connection = database.connection
+
+    def add(self, username, answers, created=None):
+        """Insert a session of [question, answer] pairs"""
+        created = created or current_time("%Y-%m-%d %H:%M:%S")
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO prompt_sessions (username, created, answers) VALUES (?, ?, ?)",
+                (username, created, json.dumps(answers, ensure_ascii=False)))
+
+    def import_legacy(self, username):
+        """Copy a user's old prompt files in, once"""
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT OR IGNORE INTO legacy_prompt_imports (username) VALUES (?)", (username,))
+            if not cursor.rowcount:
+                return
+            self.connection.executemany(
+                "INSERT INTO prompt_sessions (username, created, answers) VALUES (?, ?, ?)",
+                [(username, created, json.dumps(answers, ensure_ascii=False))
+                 for _, created, answers in read_legacy_prompt_files(username)])
+
+    def sessions(self, username):
+        """Return a user's (session id, created) pairs, newest first"""
+        self.import_legacy(username)
+        return self.connection.execute(
+            "SELECT id, created FROM prompt_sessions WHERE username = ? ORDER BY created DESC, id DESC",
+            (username,)).fetchall()
+
+    def read(self, session_id):
+        """Return a session as a dict with username, created and answers (None if missing)"""
+        row = self.connection.execute(
+            "SELECT username, created, answers FROM prompt_sessions WHERE id = ?", (session_id,)).fetchone()
+        if not row:
+            return None
+        return {'username': row[0], 'created': row[1], 'answers': json.loads(row[2])}
+
+    def close(self):
+        """Nothing to persist beyond the shared connection"""
+
+
+class SymbolMatcher:
+    """Finds dictionary symbols in dream text in a single pass
+
+    The symbols are merged into a trie, and the trie is compiled into one
+    regular expression whose alternatives share their prefixes, so the
+    text is scanned once no matter how many symbols there are. Symbols
+    only match whole words, and the longest symbol wins.
+    """
+
+    def __init__(self, symbols):
+        trie = {}
+        for symbol in symbols:
+            symbol = " ".join(symbol.lower().split())
+            if not symbol:
+                continue
+            node = trie
+            for char in symbol:
+                node = node.setdefault(char, {})
+            node[''] = True
+        self.pattern = (re.compile(rf"(?<!\w)(?:{self._trie_pattern(trie)})(?!\w)", re.IGNORECASE)
+                        if trie else None)
+
+    def _trie_pattern(self, node):
+        """Return the regex alternation matching every symbol below a trie node"""
+        branches = [re.escape(char) + self._trie_pattern(child) for char, child in node.items() if char]
+        if not branches:
+            return ""
+        pattern = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        return f"(?:{pattern})?" if '' in node else pattern
+
+    def find(self, text):
+        """Return the symbols found in text, lowercased, in order of first appearance"""
+        if self.pattern is None:
+            return ()
+        return tuple(dict.fromkeys(" ".join(match.lower().split()) for match in self.pattern.findall(text)))
+
+
+class LoginAttemptTracker:
+    """Recent failed logins per user, bounded in memory and optionally shared through a log file
+
+    Each user keeps at most `limit` failure times, and failures older than
+    `window` seconds expire. Users are kept in least-recently-failed order,
+    so expired users and, past max_users, the stalest ones are dropped from
+    the front in O(1).
+
+    With a path, every failure ("F key time") and clear ("C key time") is
+    appended to the log under a lock, and the tracker tails the log before
+    each check to pick up other sessions' entries. Once the log outgrows
+    LOGIN_ATTEMPTS_COMPACT_BYTES and twice its last compacted size it is
+    rewritten with only the live entries. The first line ("G id") names the
+    log's generation, which every rewrite changes, so other sessions notice
+    a compaction even when the new file gets the old one's inode back.
+    Users are logged by username_key, never by name.
+    """
+
+    def __init__(self, path=LOGIN_ATTEMPTS_FILE, max_users=LOGIN_TRACKER_MAX_USERS,
+                 window=LOGIN_ATTEMPT_WINDOW, limit=MAX_LOGIN_ATTEMPTS):
+        self.path = path or None
+        self.lock_path = f"{path}.lock" if path else None
+        self.max_users = max_users
+        self.window = window
+        self.limit = limit
+        self._reset()
+
+    def _reset(self):
+        """Forget everything read from the log so far"""
+        self.users = OrderedDict()  # username_key -> deque of failure times, least recently failed first
+        self.offset = 0
+        self.generation = None  # Generation line of the log read so far, b"" for logs from before them
+        self.compacted_size = 0  # Log size right after it was last compacted or read from the start
+
+    def _expire(self, now):
+        """Drop users from the front whose latest failure has left the window, then any over max_users"""
+        cutoff = now - self.window
+        while self.users:
+            key, failures = next(iter(self.users.items()))
+            if failures and failures[-1] > cutoff and len(self.users) <= self.max_users:
+                break
+            self.users.popitem(last=False)
+
+    def _apply(self, kind, key, when):
+        """Apply one failure or clear entry in memory"""
+        if kind == "C":
+            self.users.pop(key, None)
+            return
+        failures = self.users.get(key)
+        if failures is None:
+            failures = self.users[key] = deque(maxlen=self.limit)
+        failures.append(when)
+        self.users.move_to_end(key)
+
+    def _sync(self):
+        """Read entries other sessions appended to the log since we last looked"""
+        if not self.path:
+            return
+        try:
+            file = open(self.path, "rb")
+        except FileNotFoundError:
+            if self.offset:
+                self._reset()
+            return
+        with file:
+            size = os.fstat(file.fileno()).st_size
+            header = file.readline()
+            if not header.endswith(b"\n"):
+                if size < self.offset:
+                    self._reset()
+                return  # Empty, or the first entry is still being written
+            generation = header if header.startswith(b"G ") else b""
+            if generation != self.generation or size < self.offset:
+                # Compacted or replaced by another session, read it again from the start
+                self._reset()
+                self.generation = generation
+                self.offset = len(generation)
+                self.compacted_size = size
+            if size == self.offset:
+                return
+            file.seek(self.offset)
+            data = file.read(size - self.offset)
+        end = data.rfind(b"\n") + 1  # Leave a partially written line for next time
+        for line in data[:end].decode("ascii", "replace").splitlines():
+            parts = line.split()
+            if len(parts) == 3 and parts[0] in ("F", "C"):
+                try:
+                    self._apply(parts[0], parts[1], float(parts[2]))
+                except ValueError:
+                    pass
+        self.offset += end
+        self._expire(time.time())
+
+    def _log(self, kind, key, when):
+        """Apply an entry and append it to the shared log"""
+        if not self.path:
+            self._apply(kind, key, when)
+            return
+
+        with locked(self.lock_path):
+            self._sync()
+            self._apply(kind, key, when)
+            line = f"{kind} {key} {when:.3f}\n".encode("ascii")
+            with open(self.path, "ab") as file:
+                if file.tell() == 0:
+                    self.generation = self._new_generation()
+                    line = self.generation + line
+                elif file.tell() > self.offset:
+                    line = b"\n" + line  # Never glue an entry onto a torn last line
+                file.write(line)
+                self.offset = file.tell()
+            if self.offset > max(LOGIN_ATTEMPTS_COMPACT_BYTES, 2 * self.compacted_size):
+                self._compact()
+
+    def _compact(self):
+        """Rewrite the log with only the live entries (caller holds the lock)"""
+        self._expire(time.time())
+        self.generation = self._new_generation()
+        lines = [self.generation] + [f"F {key} {when:.3f}\n".encode("ascii")
+                                     for key, failures in self.users.items() for when in failures]
+        atomic_write(self.path, lines)
+        self.offset = self.compacted_size = sum(len(line) for line in lines)
+
+    def _new_generation(self):
+        """Return a fresh generation line for a new or rewritten log"""
+        return f"G {os.urandom(8).hex()}\n".encode("ascii")
+
+    def failures(self, username):
+        """Return how many failed logins a user has within the window"""
+        self._sync()
+        key = username_key(username)
+        failures = self.users.get(key)
+        if not failures:
+            return 0
+        cutoff = time.time() - self.window
+        while failures and failures[0] <= cutoff:
+            failures.popleft()
+        if not failures:
+            del self.users[key]
+        return len(failures)
+
+    def record_failure(self, username):
+        """Count a failed login, returning how many the user now has within the window"""
+        now = time.time()
+        self._log("F", username_key(username), now)
+        self._expire(now)
+        return self.failures(username)
+
+    def clear(self, username):
+        """Forget a user's failed logins"""
+        self._sync()
+        key = username_key(username)
+        if key in self.users:
+            self._log("C", key, time.time())
+
+    def close(self):
+        """Nothing to persist, every entry is written as it happens"""
+
+
+dream_store = DreamStore()
+user_directory = UserDirectory()
+symbol_table = SymbolFile()
+prompt_sessions = PromptSessionStore()
+database = None
+login_attempts = LoginAttemptTracker()
+symbol_matcher = None  # Built from the symbol dictionary on first use
+symbol_matcher_version = None  # symbol_table.version the matcher was built from
+
+
+def configure_storage(backend=STORAGE_BACKEND, database_path=DATABASE_FILE):
+    """Select the storage backend ("text" or "sqlite") used by the journal"""
+    global dream_store, user_directory, symbol_table, prompt_sessions, database, symbol_matcher
+
+    close_storage()
+    symbol_matcher = None
+    if backend == "text":
+        database = None
+        dream_store = DreamStore()
+        user_directory = UserDirectory()
+        symbol_table = SymbolFile()
+        prompt_sessions = PromptSessionStore()
+    elif backend == "sqlite":
+        database = SqliteDatabase(database_path)
+        dream_store = SqliteDreamStore(database)
+        user_directory = SqliteUserDirectory(database)
+        symbol_table = SqliteSymbolTable(database)
+        prompt_sessions = SqlitePromptSessionStore(database)
+    else:
+        raise ValueError(f"Unknown storage backend: {backend}")
+
+
+def get_symbol_matcher():
+    """Return the matcher for the built-in and custom symbols, rebuilding it when the symbols change"""
+    global symbol_matcher, symbol_matcher_version
+
+    custom_symbols = symbol_table.load()
+    if symbol_matcher is None or symbol_matcher_version != symbol_table.version:
+        symbol_matcher = SymbolMatcher(list(DREAM_SYMBOLS) + list(custom_symbols))
+        symbol_matcher_version = symbol_table.version
+    return symbol_matcher
+
+
+def symbol_exists(symbol):
+    """Return True if a symbol is already in the built-in or custom dictionary"""
+    symbol = symbol.strip().lower()
+    return symbol in DREAM_SYMBOLS or symbol in symbol_table.load()
+
+
+def close_storage():
+    """Persist indexes and close the database on exit"""
+    global database
+
+    for store in (dream_store, user_directory, symbol_table, prompt_sessions, database):
+        if store:
+            store.close()
+    database = None
+
+
+def migrate_to_sqlite(database_path=DATABASE_FILE):
+    """Copy dreams, users, custom symbols and prompt sessions from the text files into a new SQLite database"""
+    target = SqliteDatabase(database_path)
+    try:
+        existing = target.connection.execute(
+            "SELECT (SELECT COUNT(*) FROM dreams) + (SELECT COUNT(*) FROM users) "
+            "+ (SELECT COUNT(*) FROM custom_symbols) + (SELECT COUNT(*) FROM prompt_sessions)").fetchone()[0]
+        if existing:
+            raise ValueError(f"{database_path} already contains data, refusing to migrate into it")
+
+        text_dreams = DreamStore()
+        text_users = UserDirectory()
+        text_dreams.refresh()
+
+        sqlite_dreams = SqliteDreamStore(target)
+        dream_count = 0
+        for username in text_dreams.usernames():
+            sqlite_dreams.append_many(text_dreams.iter_user_dreams(username))
+            dream_count += text_dreams.count(username)
+
+        user_count = 0
+        with target.connection:
+            for user in text_users.iter_users():
+                target.connection.execute(
+                    "INSERT INTO users (username_key, username, password, full_name) VALUES (?, ?, ?, ?)",
+                    (username_key(user['username']), user['username'], user['password'], user['full_name']))
+                user_count += 1
+
+            custom_symbols = SymbolFile().load()
+            target.connection.executemany(
+                "INSERT INTO custom_symbols (symbol, meaning) VALUES (?, ?)",
+                [(symbol.capitalize(), meaning) for symbol, meaning in custom_symbols.items()])
+
+            session_count = 0
+            for record in PromptSessionStore().iter_all():
+                if 'legacy_files' in record:
+                    target.connection.execute(
+                        "INSERT OR IGNORE INTO legacy_prompt_imports (username) VALUES (?)", (record['username'],))
+                else:
+                    target.connection.execute(
+                        "INSERT INTO prompt_sessions (username, created, answers) VALUES (?, ?, ?)",
+                        (record['username'], record['created'], json.dumps(record['answers'], ensure_ascii=False)))
+                    session_count += 1
+
+        return {'dreams': dream_count, 'users': user_count, 'symbols': len(custom_symbols),
+                'sessions': session_count}
+    finally:
+        target.close()
+
+
+def detect_file_format(path, file_format=None):
+    """Return "csv" or "jsonl" for an import/export file, guessing from its extension"""
+    if file_format:
+        return file_format
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in (".jsonl", ".json"):
+        return "jsonl"
+    raise ValueError(f"Cannot tell the format of {path}, use --format csv or --format jsonl")
+
+
+def read_dream_records(path, file_format=None):
+    """Lazily yield (line number, record dict) pairs from a CSV or JSONL file"""
+    file_format = detect_file_format(path, file_format)
+    with open(path, "r", encoding="utf-8", newline="") as file:
+        if file_format == "csv":
+            import csv
+
+            reader = csv.DictReader(file)
+            for record in reader:
+                yield reader.line_num, record
+        else:
+            for line_number, line in enumerate(file, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    record = f"invalid JSON ({e})"
+                yield line_number, record
+
+
+def validate_dream_record(record, username=None):
+    """Apply the add-dream validation rules to an imported record, returning (Dream, []) or (None, all errors)"""
+    if not isinstance(record, dict):
+        return None, [record if isinstance(record, str) else "record is not an object"]
+
+    errors = []
+
+    def field(name):
+        value = record.get(name)
+        return "" if value is None else str(value).strip()
+
+    def check(validator, *args):
+        try:
+            return validator(*args)
+        except ValueError as e:
+            errors.append(str(e))
+
+    dream_username = field('username') or username
+    if dream_username:
+        check(validate_username, dream_username)
+    else:
+        errors.append("Username is missing!")
+    date = field('date') or current_time("%Y-%m-%d")
+    if not validate_date(date):
+        errors.append(f"Invalid date '{date}'! Please use a real date in YYYY-MM-DD format")
+    title = field('title')
+    check(validate_text, title, "Title")
+    description = field('description')
+    check(validate_text, description, "Description")
+    mood = field('mood')
+    check(validate_letters_only, mood, "Mood")
+    dream_type = field('dream_type')
+    check(validate_letters_only, dream_type, "Dream type")
+    intensity = check(validate_number, field('intensity'), 1, 10, "Intensity")
+    symbols = record.get('symbols') or ""
+    if isinstance(symbols, (list, tuple)):
+        symbols = ", ".join(str(symbol) for symbol in symbols)
+    symbols = str(symbols).strip()
+    if "|" in symbols or "\n" in symbols or "\r" in symbols:
+        errors.append("Symbols cannot contain '|' or line breaks!")
+
+    if errors:
+        return None, errors
+    return Dream.from_text(dream_username, date, title, description, mood, dream_type, intensity, symbols), []
+
+
+def validate_dream_records(numbered_records, username=None):
+    """Validate (line number, record) pairs in one pass, lazily yielding (line number, Dream or None, errors)"""
+    for line_number, record in numbered_records:
+        dream, errors = validate_dream_record(record, username)
+        yield line_number, dream, errors
+
+
+def import_dreams(path, file_format=None, username=None):
+    """Validate and append dreams from a CSV or JSONL file in one batch, returning (imported, [(line, errors)])
+
+    Records without symbols are tagged with the dictionary symbols found in
+    their title and description.
+    """
+    errors = []
+    known_users = {}  # lowercased username -> stored username, or None if unregistered
+    matcher = get_symbol_matcher()
+    imported = 0
+
+    def valid_dreams():
+        nonlocal imported
+        for line_number, dream, record_errors in validate_dream_records(
+                read_dream_records(path, file_format), username):
+            if dream is not None:
+                key = dream.username.lower()
+                if key not in known_users:
+                    user = user_directory.find(dream.username)
+                    known_users[key] = user['username'] if user else None
+                if known_users[key] is None:
+                    dream, record_errors = None, [f"Unknown user '{dream.username}'"]
+                else:
+                    dream.username = known_users[key]
+                    if not dream.symbols:
+                        dream.symbols = matcher.find(f"{dream.title} {dream.description}")
+            if dream is None:
+                errors.append((line_number, record_errors))
+            else:
+                imported += 1
+                yield dream
+
+    dream_store.append_many(valid_dreams())
+    return imported, errors
+
+
+def dream_record(dream):
+    """Convert a dream into a dict for export"""
+    return {'username': dream.username, 'date': dream.date, 'title': dream.title,
+            'description': dream.description, 'mood': dream.mood, 'dream_type': dream.dream_type,
+            'intensity': dream.intensity, 'symbols': dream.symbols_text}
+
+
+def export_dreams(path, file_format=None, username=None):
+    """Write all dreams (or one user's) to a CSV or JSONL file, returning how many were written"""
+    file_format = detect_file_format(path, file_format)
+    usernames = [username] if username else dream_store.usernames()
+    exported = 0
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        if file_format == "csv":
+            import csv
+
+            writer = csv.DictWriter(file, fieldnames=DREAM_FIELDS)
+            writer.writeheader()
+        for name in usernames:
+            for dream in dream_store.iter_user_dreams(name):
+                if file_format == "csv":
+                    writer.writerow(dream_record(dream))
+                else:
+                    file.write(json.dumps(dream_record(dream)) + "\n")
+                exported += 1
+    return exported
+
+
+atexit.register(close_storage)
 
 
 def add_dream_entry():
@@ -659,13 +3116,13 @@ def add_dream_entry():
         while True:
             date = input(f"{Colors.YELLOW}📅 Enter date (YYYY-MM-DD or press Enter for today): {Colors.END}").strip()
             if not date:
-                date = datetime.now().strftime("%Y-%m-%d")
+                date = current_time("%Y-%m-%d")
                 display_info(f"Using today's date: {date}")
                 break
             elif validate_date(date):
                 break
             else:
-                display_error("Invalid date format! Please use YYYY-MM-DD (e.g., 2025-11-01)")
+                display_error("Invalid date! Please use a real date in YYYY-MM-DD format (e.g., 2025-11-01)")
 
         while True:
             try:
@@ -705,19 +3162,23 @@ def add_dream_entry():
             try:
                 intensity_input = input(
                     f"{Colors.YELLOW}💥 Emotional intensity (1-10, numbers only): {Colors.END}").strip()
-                intensity_num = validate_number(intensity_input, 1, 10, "Intensity")
-                intensity = str(intensity_num)
+                intensity = validate_number(intensity_input, 1, 10, "Intensity")
                 break
             except ValueError as e:
                 display_error(str(e))
 
-        symbols = input(f"{Colors.YELLOW}🔮 Symbols or tags (comma-separated): {Colors.END}").strip()
+        symbols = input(
+            f"{Colors.YELLOW}🔮 Symbols or tags (comma-separated, or press Enter to detect them): {Colors.END}").strip()
+        if not symbols:
+            symbols = ", ".join(get_symbol_matcher().find(f"{title} {description}"))
+            if symbols:
+                display_info(f"Detected symbols: {symbols}")
 
-        dream_entry = f"{current_user['username']}|{date}|{title}|{description}|{mood}|{dream_type}|{intensity}|{symbols}\n"
+        dream_entry = Dream.from_text(current_user['username'], date, title, description, mood, dream_type,
+                                      intensity, symbols)
 
         try:
-            with open("dreams.txt", "a") as file:
-                file.write(dream_entry)
+            dream_store.append(dream_entry)
             display_success("Dream entry saved successfully! 🌟")
         except IOError:
             display_error("Could not save dream entry to file.")
@@ -730,33 +3191,16 @@ def add_dream_entry():
         input(f"\n{Colors.CYAN}Press Enter to continue...{Colors.END}")
 
 
+def iter_dreams(user=None, predicate=None):
+    """Lazily yield a user's dreams (default: the current user), optionally filtered by predicate"""
+    username = (user or current_user)['username']
+    return dream_store.iter_user_dreams(username, predicate)
+
+
 def get_user_dreams():
     """Get all dreams for the current user"""
     try:
-        with open("dreams.txt", "r") as file:
-            dreams = file.readlines()
-
-        user_dreams = []
-        for dream in dreams:
-            try:
-                parts = dream.strip().split("|")
-                if len(parts) >= 8:
-                    username, date, title, description, mood, dream_type, intensity, symbols = parts
-                    if username == current_user['username']:
-                        user_dreams.append({
-                            'username': username,
-                            'date': date,
-                            'title': title,
-                            'description': description,
-                            'mood': mood,
-                            'dream_type': dream_type,
-                            'intensity': intensity,
-                            'symbols': symbols
-                        })
-            except Exception:
-                continue
-
-        return user_dreams
+        return dream_store.get_user_dreams(current_user['username'])
     except FileNotFoundError:
         return []
     except Exception as e:
@@ -764,33 +3208,63 @@ def get_user_dreams():
         return []
 
 
+def format_dream_card(dream, number):
+    """Render one dream as a colored box, ready to be written in one go"""
+    lines = [
+        (f"┌{'─' * 58}┐", Colors.CYAN),
+        (f"│ 🦋 Dream #{number: <51} │", Colors.PURPLE),
+        (f"├{'─' * 58}┤", Colors.CYAN),
+        (f"│ 📅 Date: {dream.date: <47} │", Colors.WHITE),
+        (f"│ 🏷️  Title: {dream.title: <46} │", Colors.WHITE),
+        (f"│ 📖 Description: {dream.description[:40]: <37} │", Colors.WHITE),
+        (f"│ 😊 Mood: {dream.mood: <47} │", Colors.WHITE),
+        (f"│ 🌙 Type: {dream.dream_type: <46} │", Colors.WHITE),
+        (f"│ 💥 Intensity: {dream.intensity_text}/10{' ': <37} │", Colors.WHITE),
+        (f"│ 🔮 Symbols: {dream.symbols_text[:40]: <38} │", Colors.WHITE),
+        (f"└{'─' * 58}┘", Colors.CYAN),
+    ]
+    return "".join(f"{color}{text}{Colors.END}\n" for text, color in lines) + "\n"
+
+
 def view_all_dreams():
-    """View all dream entries for the current user"""
-    clear_screen()
-    print_color("╔══════════════════════════════════════════════════════════╗", Colors.CYAN)
-    print_color("║                     📖 MY DREAM ENTRIES                  ║", Colors.BOLD + Colors.PURPLE)
-    print_color("╚══════════════════════════════════════════════════════════╝", Colors.CYAN)
-    print()
+    """View the current user's dream entries a page at a time"""
+    try:
+        total_dreams = dream_store.count(current_user['username'])
+    except Exception as e:
+        display_error(f"Error reading dreams: {e}")
+        total_dreams = 0
+
+    page_count = max((total_dreams + DREAMS_PAGE_SIZE - 1) // DREAMS_PAGE_SIZE, 1)
+    page_number = 0
+    while True:
+        clear_screen()
+        print_color("╔══════════════════════════════════════════════════════════╗", Colors.CYAN)
+        print_color("║                     📖 MY DREAM ENTRIES                  ║", Colors.BOLD + Colors.PURPLE)
+        print_color("╚══════════════════════════════════════════════════════════╝", Colors.CYAN)
+        print()
 
-    user_dreams = get_user_dreams()
+        if not total_dreams:
+            display_warning("No dreams found. Start by adding your first dream! 🌟")
+            break
 
-    if not user_dreams:
-        display_warning("No dreams found. Start by adding your first dream! 🌟")
-    else:
-        print_color(f"📊 Total dreams: {len(user_dreams)}\n", Colors.GREEN)
-        for i, dream in enumerate(user_dreams, 1):
-            print_color(f"┌{'─' * 58}┐", Colors.CYAN)
-            print_color(f"│ 🦋 Dream #{i: <51} │", Colors.PURPLE)
-            print_color(f"├{'─' * 58}┤", Colors.CYAN)
-            print_color(f"│ 📅 Date: {dream['date']: <47} │", Colors.WHITE)
-            print_color(f"│ 🏷️  Title: {dream['title']: <46} │", Colors.WHITE)
-            print_color(f"│ 📖 Description: {dream['description'][:40]: <37} │", Colors.WHITE)
-            print_color(f"│ 😊 Mood: {dream['mood']: <47} │", Colors.WHITE)
-            print_color(f"│ 🌙 Type: {dream['dream_type']: <46} │", Colors.WHITE)
-            print_color(f"│ 💥 Intensity: {dream['intensity']}/10{' ': <37} │", Colors.WHITE)
-            print_color(f"│ 🔮 Symbols: {dream['symbols'][:40]: <38} │", Colors.WHITE)
-            print_color(f"└{'─' * 58}┘", Colors.CYAN)
-            print()
+        # Only this page's dreams are read, and the page goes to the terminal in a single write
+        start = page_number * DREAMS_PAGE_SIZE
+        dreams = dream_store.page(current_user['username'], start, DREAMS_PAGE_SIZE)
+        output = [f"{Colors.GREEN}📊 Total dreams: {total_dreams} "
+                  f"(page {page_number + 1} of {page_count}){Colors.END}\n\n"]
+        output.extend(format_dream_card(dream, number) for number, dream in enumerate(dreams, start + 1))
+        sys.stdout.write("".join(output))
+        sys.stdout.flush()
+
+        if page_count == 1:
+            break
+        choice = input(f"{Colors.YELLOW}[N]ext page, [P]revious page, or Enter to go back: {Colors.END}").strip().lower()
+        if choice == 'n':
+            page_number = min(page_number + 1, page_count - 1)
+        elif choice == 'p':
+            page_number = max(page_number - 1, 0)
+        else:
+            return
 
     input(f"\n{Colors.CYAN}Press Enter to continue...{Colors.END}")
 
@@ -810,23 +3284,27 @@ def search_dreams():
         input(f"\n{Colors.CYAN}Press Enter to continue...{Colors.END}")
         return
 
-    user_dreams = get_user_dreams()
-    found_count = 0
+    try:
+        matches = dream_store.search(current_user['username'], keyword, prefix=True)
+    except FileNotFoundError:
+        matches = []
+    except Exception as e:
+        display_error(f"Error searching dreams: {e}")
+        matches = []
 
-    for i, dream in enumerate(user_dreams, 1):
-        dream_text = f"{dream['title']} {dream['description']} {dream['mood']} {dream['dream_type']} {dream['symbols']}".lower()
-
-        if keyword in dream_text:
-            found_count += 1
-            print_color(f"\n🎯 Match #{found_count} (Dream #{i})", Colors.GREEN)
-            print_color(f"📅 Date: {dream['date']}", Colors.CYAN)
-            print_color(f"🏷️  Title: {dream['title']}", Colors.CYAN)
-            print_color(f"📖 Description: {dream['description']}", Colors.CYAN)
-            print_color(f"😊 Mood: {dream['mood']}", Colors.CYAN)
-            print_color(f"🌙 Type: {dream['dream_type']}", Colors.CYAN)
-            print_color(f"💥 Intensity: {dream['intensity']}/10", Colors.CYAN)
-            print_color(f"🔮 Symbols: {dream['symbols']}", Colors.CYAN)
-            print_color("-" * 50, Colors.CYAN)
+    found_count = 0
+    for dream in matches:
+        found_count += 1
+        i = dream_store.dream_number(current_user['username'], dream.id)
+        print_color(f"\n🎯 Match #{found_count} (Dream #{i})", Colors.GREEN)
+        print_color(f"📅 Date: {dream.date}", Colors.CYAN)
+        print_color(f"🏷️  Title: {dream.title}", Colors.CYAN)
+        print_color(f"📖 Description: {dream.description}", Colors.CYAN)
+        print_color(f"😊 Mood: {dream.mood}", Colors.CYAN)
+        print_color(f"🌙 Type: {dream.dream_type}", Colors.CYAN)
+        print_color(f"💥 Intensity: {dream.intensity_text}/10", Colors.CYAN)
+        print_color(f"🔮 Symbols: {dream.symbols_text}", Colors.CYAN)
+        print_color("-" * 50, Colors.CYAN)
 
     if found_count == 0:
         display_warning(f"No dreams found containing '{keyword}'")
@@ -844,9 +3322,13 @@ def filter_dreams_by_date():
     print_color("╚══════════════════════════════════════════════════════════╝", Colors.CYAN)
     print()
 
-    user_dreams = get_user_dreams()
+    try:
+        total_dreams = dream_store.count(current_user['username'])
+    except Exception as e:
+        display_error(f"Error reading dreams: {e}")
+        total_dreams = 0
 
-    if not user_dreams:
+    if not total_dreams:
         display_warning("No dreams found to filter.")
         input(f"\n{Colors.CYAN}Press Enter to continue...{Colors.END}")
         return
@@ -855,43 +3337,32 @@ def filter_dreams_by_date():
 
     # Get start date
     while True:
-        start_date = input(f"{Colors.YELLOW}📅 Enter start date (YYYY-MM-DD): {Colors.END}").strip()
+        start_date = input(f"{Colors.YELLOW}📅 Enter start date (YYYY-MM-DD or press Enter for no limit): {Colors.END}").strip()
         if validate_date(start_date):
             break
         else:
-            display_error("Invalid date format! Please use YYYY-MM-DD (e.g., 2025-11-01)")
+            display_error("Invalid date! Please use a real date in YYYY-MM-DD format (e.g., 2025-11-01)")
 
     # Get end date
     while True:
-        end_date = input(f"{Colors.YELLOW}📅 Enter end date (YYYY-MM-DD): {Colors.END}").strip()
+        end_date = input(f"{Colors.YELLOW}📅 Enter end date (YYYY-MM-DD or press Enter for no limit): {Colors.END}").strip()
         if validate_date(end_date):
             break
         else:
-            display_error("Invalid date format! Please use YYYY-MM-DD (e.g., 2025-11-01)")
+            display_error("Invalid date! Please use a real date in YYYY-MM-DD format (e.g., 2025-11-01)")
+
+    start_date, end_date = date_range(start_date, end_date)
 
-    # Filter dreams by date range
-    filtered_dreams = []
-    for dream in user_dreams:
-        if start_date <= dream['date'] <= end_date:
-            filtered_dreams.append(dream)
+    # Look up the date range in the date index
+    found_count = dream_store.count_between(current_user['username'], start_date, end_date)
 
-    if not filtered_dreams:
+    if not found_count:
         display_warning(f"No dreams found between {start_date} and {end_date}")
     else:
-        print_color(f"\n📊 Dreams found between {start_date} and {end_date}: {len(filtered_dreams)}\n", Colors.GREEN)
+        print_color(f"\n📊 Dreams found between {start_date} and {end_date}: {found_count}\n", Colors.GREEN)
+        filtered_dreams = dream_store.iter_between(current_user['username'], start_date, end_date)
         for i, dream in enumerate(filtered_dreams, 1):
-            print_color(f"┌{'─' * 58}┐", Colors.CYAN)
-            print_color(f"│ 🦋 Dream #{i: <51} │", Colors.PURPLE)
-            print_color(f"├{'─' * 58}┤", Colors.CYAN)
-            print_color(f"│ 📅 Date: {dream['date']: <47} │", Colors.WHITE)
-            print_color(f"│ 🏷️  Title: {dream['title']: <46} │", Colors.WHITE)
-            print_color(f"│ 📖 Description: {dream['description'][:40]: <37} │", Colors.WHITE)
-            print_color(f"│ 😊 Mood: {dream['mood']: <47} │", Colors.WHITE)
-            print_color(f"│ 🌙 Type: {dream['dream_type']: <46} │", Colors.WHITE)
-            print_color(f"│ 💥 Intensity: {dream['intensity']}/10{' ': <37} │", Colors.WHITE)
-            print_color(f"│ 🔮 Symbols: {dream['symbols'][:40]: <38} │", Colors.WHITE)
-            print_color(f"└{'─' * 58}┘", Colors.CYAN)
-            print()
+            sys.stdout.write(format_dream_card(dream, i))
 
     input(f"\n{Colors.CYAN}Press Enter to continue...{Colors.END}")
 
@@ -906,6 +3377,8 @@ def get_dream_prompts():
     print_color("Answer these questions to help remember your dream:\n", Colors.CYAN)
 
     try:
+        import random
+
         selected_prompts = random.sample(DREAM_PROMPTS, 5)
         answers = []
 
@@ -915,26 +3388,16 @@ def get_dream_prompts():
             print_color(f"{i}. {prompt}", Colors.CYAN + Colors.BOLD)
             answer = input(f"{Colors.YELLOW}   Your answer: {Colors.END}").strip()
             if answer:
-                answers.append(f"Q: {prompt}\nA: {answer}\n")
+                answers.append([prompt, answer])
             print()
 
         if answers:
-            # Save answers to file
-            timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-            filename = f"dream_prompts_{current_user['username']}_{timestamp}.txt"
-
             try:
-                with open(filename, "w", encoding="utf-8") as file:
-                    file.write(f"Dream Recall Session - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                    file.write(f"User: {current_user['username']}\n")
-                    file.write("=" * 50 + "\n\n")
-                    for answer in answers:
-                        file.write(answer + "\n")
-
-                display_success(f"Your dream recall answers have been saved to: {filename}")
+                prompt_sessions.add(current_user['username'], answers)
+                display_success("Your dream recall answers have been saved!")
                 display_info("You can view your answers in 'View Dream Prompt Answers' menu.")
             except IOError:
-                display_error("Could not save your answers to file.")
+                display_error("Could not save your answers.")
         else:
             display_warning("No answers provided. Nothing to save.")
 
@@ -944,6 +3407,14 @@ def get_dream_prompts():
         input(f"\n{Colors.CYAN}Press Enter to continue...{Colors.END}")
 
 
+def format_prompt_session(session):
+    """Render a prompt session the way the old per-session files looked"""
+    lines = [f"Dream Recall Session - {session['created']}", f"User: {session['username']}", "=" * 50, ""]
+    for question, answer in session['answers']:
+        lines.extend([f"Q: {question}", f"A: {answer}", ""])
+    return "\n".join(lines)
+
+
 def view_dream_prompt_answers():
     """View saved dream prompt answers"""
     clear_screen()
@@ -953,25 +3424,17 @@ def view_dream_prompt_answers():
     print()
 
     try:
-        # Find all prompt answer files for current user
-        import glob
-        pattern = f"dream_prompts_{current_user['username']}_*.txt"
-        prompt_files = glob.glob(pattern)
+        sessions = prompt_sessions.sessions(current_user['username'])
 
-        if not prompt_files:
+        if not sessions:
             display_warning("No dream prompt answers found.")
             display_info("Use 'Get Dream Prompts' to create your first dream recall session.")
             input(f"\n{Colors.CYAN}Press Enter to continue...{Colors.END}")
             return
 
-        # Sort files by creation time (newest first)
-        prompt_files.sort(key=os.path.getctime, reverse=True)
-
         print_color("📁 Your Dream Recall Sessions:\n", Colors.GREEN)
-        for i, filename in enumerate(prompt_files, 1):
-            file_time = os.path.getctime(filename)
-            formatted_time = datetime.fromtimestamp(file_time).strftime("%Y-%m-%d %H:%M:%S")
-            print_color(f"{i}. {filename} ({formatted_time})", Colors.WHITE)
+        for i, (_, created) in enumerate(sessions, 1):
+            print_color(f"{i}. Dream Recall Session ({created})", Colors.WHITE)
 
         print()
         choice = input(f"{Colors.YELLOW}🎯 Enter session number to view (or 0 to go back): {Colors.END}").strip()
@@ -981,8 +3444,8 @@ def view_dream_prompt_answers():
 
         try:
             choice_num = int(choice)
-            if 1 <= choice_num <= len(prompt_files):
-                selected_file = prompt_files[choice_num - 1]
+            if 1 <= choice_num <= len(sessions):
+                session = prompt_sessions.read(sessions[choice_num - 1][0])
 
                 clear_screen()
                 print_color("╔══════════════════════════════════════════════════════════╗", Colors.CYAN)
@@ -990,12 +3453,10 @@ def view_dream_prompt_answers():
                 print_color("╚══════════════════════════════════════════════════════════╝", Colors.CYAN)
                 print()
 
-                try:
-                    with open(selected_file, "r", encoding="utf-8") as file:
-                        content = file.read()
-                        print_color(content, Colors.WHITE)
-                except IOError:
-                    display_error("Could not read the selected file.")
+                if session:
+                    print_color(format_prompt_session(session), Colors.WHITE)
+                else:
+                    display_error("Could not read the selected session.")
             else:
                 display_error("Invalid selection!")
         except ValueError:
@@ -1015,58 +3476,58 @@ def analyze_patterns():
     print_color("╚══════════════════════════════════════════════════════════╝", Colors.CYAN)
     print()
 
-    user_dreams = get_user_dreams()
+    try:
+        stats = dream_store.pattern_stats(current_user['username'])
+    except Exception as e:
+        display_error(f"Error reading dreams: {e}")
+        stats = None
 
-    if not user_dreams:
+    if not stats:
         display_warning("No dreams to analyze yet.")
         input(f"\n{Colors.CYAN}Press Enter to continue...{Colors.END}")
         return
 
-    total_dreams = len(user_dreams)
-    moods = {}
-    types = {}
-    symbols_count = {}
-    intensities = []
-
-    for dream in user_dreams:
-        mood = dream['mood'].strip()
-        moods[mood] = moods.get(mood, 0) + 1
-
-        dream_type = dream['dream_type'].strip()
-        types[dream_type] = types.get(dream_type, 0) + 1
-
-        symbol_list = [s.strip() for s in dream['symbols'].split(",") if s.strip()]
-        for symbol in symbol_list:
-            symbols_count[symbol] = symbols_count.get(symbol, 0) + 1
+    print_pattern_stats(stats)
+    input(f"\n{Colors.CYAN}Press Enter to continue...{Colors.END}")
 
-        try:
-            intensities.append(int(dream['intensity']))
-        except ValueError:
-            pass
 
-    print_color(f"📈 Total Dreams Recorded: {total_dreams}\n", Colors.GREEN)
+def print_pattern_stats(stats):
+    """Print a pattern statistics report"""
+    print_color(f"📈 Total Dreams Recorded: {stats['total']}\n", Colors.GREEN)
 
     print_color("🎭 MOOD DISTRIBUTION", Colors.PURPLE + Colors.BOLD)
-    for mood, count in sorted(moods.items(), key=lambda x: x[1], reverse=True):
+    for mood, count in stats['moods']:
         print_color(f"   {mood}: {count} time(s)", Colors.WHITE)
 
     print_color("\n🔮 DREAM TYPES", Colors.PURPLE + Colors.BOLD)
-    for dtype, count in sorted(types.items(), key=lambda x: x[1], reverse=True):
+    for dtype, count in stats['types']:
         print_color(f"   {dtype}: {count} time(s)", Colors.WHITE)
 
     print_color("\n🌟 MOST COMMON SYMBOLS", Colors.PURPLE + Colors.BOLD)
-    sorted_symbols = sorted(symbols_count.items(), key=lambda x: x[1], reverse=True)[:10]
-    for symbol, count in sorted_symbols:
+    for symbol, count in stats['symbols']:
         print_color(f"   {symbol}: {count} time(s)", Colors.WHITE)
 
-    if intensities:
-        avg_intensity = sum(intensities) / len(intensities)
+    if stats['average_intensity'] is not None:
         print_color(f"\n💥 EMOTIONAL INTENSITY", Colors.PURPLE + Colors.BOLD)
-        print_color(f"   Average Intensity: {avg_intensity:.1f}/10", Colors.WHITE)
-        print_color(f"   Highest Intensity: {max(intensities)}/10", Colors.WHITE)
-        print_color(f"   Lowest Intensity: {min(intensities)}/10", Colors.WHITE)
+        print_color(f"   Average Intensity: {stats['average_intensity']:.1f}/10", Colors.WHITE)
+        print_color(f"   Highest Intensity: {stats['max_intensity']}/10", Colors.WHITE)
+        print_color(f"   Lowest Intensity: {stats['min_intensity']}/10", Colors.WHITE)
 
-    input(f"\n{Colors.CYAN}Press Enter to continue...{Colors.END}")
+
+def show_site_stats(workers=None):
+    """Print dream statistics across all users (admin report)"""
+    print_color("=" * 60, Colors.CYAN)
+    print_color("              📊 SITE-WIDE DREAM STATISTICS", Colors.BOLD + Colors.PURPLE)
+    print_color("=" * 60, Colors.CYAN)
+    print()
+
+    stats = dream_store.corpus_stats(workers)
+    if not stats:
+        display_warning("No dreams recorded yet.")
+        return
+
+    print_color(f"👥 Journalers: {stats['users']}", Colors.GREEN)
+    print_pattern_stats(stats)
 
 
 def view_symbol_dictionary():
@@ -1084,16 +3545,7 @@ def view_symbol_dictionary():
             print_color(f"   {meaning}\n", Colors.WHITE)
 
         # Load and display custom symbols
-        custom_symbols = {}
-        try:
-            with open("custom_symbols.txt", "r") as file:
-                for line in file:
-                    line = line.strip()
-                    if ':' in line:
-                        symbol, meaning = line.split(':', 1)
-                        custom_symbols[symbol.strip().lower()] = meaning.strip()
-        except FileNotFoundError:
-            pass
+        custom_symbols = symbol_table.load()
 
         if custom_symbols:
             print_color("🎨 YOUR CUSTOM SYMBOLS\n", Colors.GREEN + Colors.BOLD)
@@ -1116,22 +3568,6 @@ def add_custom_symbol():
     print()
 
     try:
-        # Load existing custom symbols first
-        existing_symbols = set()
-        try:
-            with open("custom_symbols.txt", "r") as file:
-                for line in file:
-                    line = line.strip()
-                    if ':' in line:
-                        symbol = line.split(':')[0].strip().lower()
-                        existing_symbols.add(symbol)
-        except FileNotFoundError:
-            pass
-
-        # Also check built-in symbols
-        for builtin_symbol in DREAM_SYMBOLS.keys():
-            existing_symbols.add(builtin_symbol.lower())
-
         while True:
             symbol = input(f"{Colors.YELLOW}🔮 Enter symbol name: {Colors.END}").strip().lower()
             if not symbol:
@@ -1139,7 +3575,7 @@ def add_custom_symbol():
                 continue
 
             # Check if symbol already exists
-            if symbol in existing_symbols:
+            if symbol_exists(symbol):
                 display_warning(f"Symbol '{symbol.capitalize()}' already exists in the dictionary!")
                 continue_choice = input(f"{Colors.YELLOW}Do you want to add it anyway? (y/n): {Colors.END}").strip().lower()
                 if continue_choice != 'y':
@@ -1151,11 +3587,8 @@ def add_custom_symbol():
         if not meaning:
             raise ValueError("Meaning cannot be empty!")
 
-        entry = f"{symbol.capitalize()}: {meaning}\n"
-
         try:
-            with open("custom_symbols.txt", "a") as file:
-                file.write(entry)
+            symbol_table.add(symbol, meaning)
             display_success("Custom symbol added successfully! 🌟")
         except IOError:
             display_error("Could not save custom symbol.")
@@ -1177,53 +3610,37 @@ def delete_dream():
     print()
 
     try:
-        user_dreams = get_user_dreams()
-
-        if not user_dreams:
+        # Keep only the ids and fingerprints while listing, not the dreams themselves
+        dream_ids = []
+        for i, dream in enumerate(iter_dreams(), 1):
+            if i == 1:
+                print_color("Your dreams:\n", Colors.CYAN)
+            print_color(f"{i}. 📅 {dream.date} - 🏷️  {dream.title}", Colors.WHITE)
+            dream_ids.append((dream.id, dream_fingerprint(dream)))
+
+        if not dream_ids:
             display_warning("No dreams to delete.")
             input(f"\n{Colors.CYAN}Press Enter to continue...{Colors.END}")
             return
 
-        print_color("Your dreams:\n", Colors.CYAN)
-        for i, dream in enumerate(user_dreams, 1):
-            print_color(f"{i}. 📅 {dream['date']} - 🏷️  {dream['title']}", Colors.WHITE)
-
         while True:
             try:
                 choice = input(
-                    f"\n{Colors.YELLOW}🎯 Enter dream number to delete (1-{len(user_dreams)}) or 0 to cancel: {Colors.END}").strip()
+                    f"\n{Colors.YELLOW}🎯 Enter dream number to delete (1-{len(dream_ids)}) or 0 to cancel: {Colors.END}").strip()
                 choice_num = int(choice)
 
                 if choice_num == 0:
                     display_info("Deletion cancelled.")
                     break
-                elif 1 <= choice_num <= len(user_dreams):
+                elif 1 <= choice_num <= len(dream_ids):
                     while True:
                         confirm = input(
                             f"{Colors.YELLOW}⚠️  Are you sure you want to delete dream #{choice_num}? (y/yes or n/no): {Colors.END}").strip().lower()
                         if confirm in ["y", "yes"]:
-                            with open("dreams.txt", "r") as file:
-                                all_dreams = file.readlines()
-
-                            dream_to_delete = user_dreams[choice_num - 1]
-                            new_dreams = []
-
-                            for dream_line in all_dreams:
-                                try:
-                                    parts = dream_line.strip().split("|")
-                                    if len(parts) >= 8:
-                                        username, date, title, description, mood, dream_type, intensity, symbols = parts
-                                        if not (username == dream_to_delete['username'] and
-                                                date == dream_to_delete['date'] and
-                                                title == dream_to_delete['title']):
-                                            new_dreams.append(dream_line)
-                                except Exception:
-                                    new_dreams.append(dream_line)
-
-                            with open("dreams.txt", "w") as file:
-                                file.writelines(new_dreams)
-
-                            display_success("Dream deleted successfully!")
+                            if dream_store.delete(*dream_ids[choice_num - 1]):
+                                display_success("Dream deleted successfully!")
+                            else:
+                                display_error("That dream was changed or deleted in another session, nothing was deleted.")
                             break
                         elif confirm in ["n", "no"]:
                             display_info("Deletion cancelled.")
@@ -1232,7 +3649,7 @@ def delete_dream():
                             display_error("Invalid input! Please type 'y'/'yes' to confirm or 'n'/'no' to cancel.")
                     break
                 else:
-                    display_error(f"Please enter a number between 1 and {len(user_dreams)}.")
+                    display_error(f"Please enter a number between 1 and {len(dream_ids)}.")
             except ValueError:
                 display_error("Invalid input! Please enter a number.")
             except Exception as e:
@@ -1252,6 +3669,8 @@ def main():
     global current_user
 
     display_welcome()
+    if PROFILE_STARTUP:
+        print(f"Startup took {(time.perf_counter() - STARTUP_STARTED) * 1000:.1f} ms", file=sys.stderr)
     input(f"\n{Colors.CYAN}Press Enter to start your dream journey...{Colors.END}")
 
     while True:
@@ -1296,5 +3715,337 @@ def main():
                 input(f"\n{Colors.CYAN}Press Enter to continue...{Colors.END}")
 
 
+class JournalServer:
+    """Serves the journal to many clients at once over a line protocol
+
+    Each request is one line, a command followed by its arguments, and each
+    response is one JSON object on its own line with "ok" set. Every
+    connection keeps its own login session. Storage calls run in worker
+    threads one at a time under a lock, because the stores are not thread
+    safe, while password hashing runs outside the lock so logins from many
+    clients proceed in parallel.
+
+        LOGIN <username> <password>
+        REGISTER <username> <password> <full name>
+        ADD <JSON object with date, title, description, mood, dream_type, intensity, symbols>
+        LIST [start] [count]
+        SEARCH <keywords>
+        FILTER [start date] [end date]
+        STATS
+        DELETE <dream id>
+        SYMBOLS
+        LOGOUT
+        QUIT
+
+    Dream ids are opaque tokens carrying the dream's position and a
+    checksum of its contents. A DELETE whose dream has since moved, as
+    compaction does, or changed is refused, and the client should LIST
+    again for current ids.
+    """
+
+    COMMANDS = ("LOGIN", "REGISTER", "ADD", "LIST", "SEARCH", "FILTER", "STATS", "DELETE", "SYMBOLS",
+                "LOGOUT", "QUIT")
+    MAX_RESULTS = 100  # Dreams returned by one LIST or SEARCH
+
+    def __init__(self):
+        import asyncio
+
+        self.lock = asyncio.Lock()
+
+    async def locked(self, function, *args):
+        """Run a storage call in a worker thread while holding the storage lock"""
+        import asyncio
+
+        async with self.lock:
+            return await asyncio.to_thread(function, *args)
+
+    async def handle(self, reader, writer):
+        """Serve one connection until it quits or disconnects"""
+        session = {'user': None}
+        await self.send(writer, {'ok': True, 'server': "dream_journal", 'commands': list(self.COMMANDS)})
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command, _, argument = line.decode("utf-8", "replace").strip().partition(" ")
+                command = command.upper()
+                if not command:
+                    continue
+                if command not in self.COMMANDS:
+                    await self.send(writer, {'ok': False, 'error': f"Unknown command: {command}"})
+                    continue
+                try:
+                    response = await getattr(self, f"command_{command.lower()}")(session, argument.strip())
+                except ValueError as e:
+                    response = {'ok': False, 'error': str(e)}
+                except Exception as e:
+                    response = {'ok': False, 'error': f"Unexpected error: {e}"}
+                await self.send(writer, response)
+                if command == "QUIT":
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def send(self, writer, response):
+        """Write one JSON response line"""
+        writer.write((json.dumps(response, ensure_ascii=False) + "\n").encode("utf-8"))
+        await writer.drain()
+
+    def username(self, session):
+        """Return the logged in username, or raise if the connection has not logged in"""
+        if not session['user']:
+            raise ValueError("Please LOGIN first")
+        return session['user']['username']
+
+    def dream_response(self, dream):
+        """Convert a dream into a response dict"""
+        import base64
+        import struct
+
+        response = dream_record(dream)
+        token = struct.pack(">QI", dream.id, dream_fingerprint(dream))
+        response['id'] = base64.urlsafe_b64encode(token).decode("ascii")
+        return response
+
+    def parse_dream_id(self, dream_id):
+        """Return the (store id, fingerprint) in a dream id sent to a client"""
+        import base64
+        import struct
+
+        try:
+            return struct.unpack(">QI", base64.urlsafe_b64decode(dream_id.encode("ascii")))
+        except (ValueError, struct.error):
+            raise ValueError("Usage: DELETE <dream id from LIST, SEARCH or FILTER>")
+
+    async def command_login(self, session, argument):
+        """LOGIN <username> <password>"""
+        import asyncio
+
+        username, _, password = argument.partition(" ")
+        if not username or not password:
+            raise ValueError("Usage: LOGIN <username> <password>")
+        if await self.locked(login_attempts.failures, username) >= MAX_LOGIN_ATTEMPTS:
+            raise ValueError("Too many failed login attempts, reset your password in the journal app")
+
+        user = await self.locked(user_directory.find, username)
+        if not user:
+            raise ValueError("Username not found!")
+        if not await asyncio.to_thread(verify_password, password, user['password']):
+            attempts_left = MAX_LOGIN_ATTEMPTS - await self.locked(login_attempts.record_failure, username)
+            raise ValueError(f"Incorrect password! Attempts left: {max(attempts_left, 0)}")
+
+        if password_needs_rehash(user['password']):
+            password_hash = await asyncio.to_thread(hash_password, password)
+            await self.locked(user_directory.update_password, user['username'], password_hash)
+        await self.locked(login_attempts.clear, username)
+        session['user'] = {'username': user['username'], 'full_name': user['full_name']}
+        return {'ok': True, 'username': user['username'], 'full_name': user['full_name']}
+
+    async def command_register(self, session, argument):
+        """REGISTER <username> <password> <full name>"""
+        import asyncio
+
+        username, _, rest = argument.partition(" ")
+        password, _, full_name = rest.partition(" ")
+        validate_username(username)
+        validate_password(password)
+        validate_letters_only(full_name, "Full name")
+        password_hash = await asyncio.to_thread(hash_password, password)
+
+        def add_user():
+            if not user_directory.add(username, password_hash, full_name.strip()):
+                raise ValueError("Username already exists! Please choose another.")
+
+        await self.locked(add_user)
+        return {'ok': True, 'username': username}
+
+    async def command_add(self, session, argument):
+        """ADD <JSON dream>"""
+        username = self.username(session)
+        try:
+            record = json.loads(argument)
+        except ValueError:
+            raise ValueError("Usage: ADD <JSON object with the dream fields>")
+        if not isinstance(record, dict):
+            raise ValueError("Usage: ADD <JSON object with the dream fields>")
+        dream, errors = validate_dream_record(dict(record, username=username))
+        if errors:
+            return {'ok': False, 'errors': errors}
+
+        def add_dream():
+            if not dream.symbols:
+                dream.symbols = get_symbol_matcher().find(f"{dream.title} {dream.description}")
+            dream_store.append(dream)
+
+        await self.locked(add_dream)
+        return {'ok': True, 'symbols': list(dream.symbols)}
+
+    async def command_list(self, session, argument):
+        """LIST [start] [count]"""
+        username = self.username(session)
+        try:
+            numbers = [int(value) for value in argument.split()]
+        except ValueError:
+            raise ValueError("Usage: LIST [start] [count]")
+        start = max(numbers[0], 0) if numbers else 0
+        count = min(max(numbers[1], 0), self.MAX_RESULTS) if len(numbers) > 1 else DREAMS_PAGE_SIZE
+
+        def list_dreams():
+            return dream_store.count(username), dream_store.page(username, start, count)
+
+        total, dreams = await self.locked(list_dreams)
+        return {'ok': True, 'total': total, 'start': start, 'dreams': [self.dream_response(dream) for dream in dreams]}
+
+    async def command_search(self, session, argument):
+        """SEARCH <keywords>"""
+        import itertools
+
+        username = self.username(session)
+        if not argument:
+            raise ValueError("Search keyword cannot be empty!")
+        dreams = await self.locked(
+            lambda: list(itertools.islice(dream_store.search(username, argument.lower(), prefix=True),
+                                          self.MAX_RESULTS)))
+        return {'ok': True, 'dreams': [self.dream_response(dream) for dream in dreams]}
+
+    async def command_filter(self, session, argument):
+        """FILTER [start date] [end date]"""
+        import itertools
+
+        username = self.username(session)
+        dates = argument.split()
+        if len(dates) > 2 or not all(validate_date(date) for date in dates):
+            raise ValueError("Usage: FILTER [start YYYY-MM-DD] [end YYYY-MM-DD]")
+        start_date, end_date = date_range(*(dates + [""] * (2 - len(dates))))
+
+        def filter_dreams():
+            return (dream_store.count_between(username, start_date, end_date),
+                    list(itertools.islice(dream_store.iter_between(username, start_date, end_date),
+                                          self.MAX_RESULTS)))
+
+        total, dreams = await self.locked(filter_dreams)
+        return {'ok': True, 'total': total, 'dreams': [self.dream_response(dream) for dream in dreams]}
+
+    async def command_stats(self, session, argument):
+        """STATS"""
+        username = self.username(session)
+        return {'ok': True, 'stats': await self.locked(dream_store.pattern_stats, username)}
+
+    async def command_delete(self, session, argument):
+        """DELETE <dream id>"""
+        username = self.username(session)
+        dream_id, fingerprint = self.parse_dream_id(argument)
+
+        def delete_dream():
+            # The fingerprint is checked again by delete() under the store's locks
+            dream = dream_store.get_dream(username, dream_id)
+            if not dream or dream_fingerprint(dream) != fingerprint or not dream_store.delete(dream_id, fingerprint):
+                raise ValueError("No such dream, it may have been deleted or moved: LIST again for current ids")
+
+        await self.locked(delete_dream)
+        return {'ok': True}
+
+    async def command_symbols(self, session, argument):
+        """SYMBOLS"""
+        custom_symbols = await self.locked(lambda: dict(symbol_table.load()))
+        return {'ok': True, 'builtin': DREAM_SYMBOLS, 'custom': custom_symbols}
+
+    async def command_logout(self, session, argument):
+        """LOGOUT"""
+        session['user'] = None
+        return {'ok': True}
+
+    async def command_quit(self, session, argument):
+        """QUIT"""
+        return {'ok': True}
+
+
+async def serve(host="127.0.0.1", port=8765, socket_path=None):
+    """Run the journal server on a TCP port or a Unix socket until interrupted"""
+    import asyncio
+
+    server = JournalServer()
+    if socket_path:
+        listener = await asyncio.start_unix_server(server.handle, path=socket_path)
+        print(f"Serving the dream journal on {socket_path}")
+    else:
+        listener = await asyncio.start_server(server.handle, host, port)
+        print(f"Serving the dream journal on {host}:{port}")
+    async with listener:
+        await listener.serve_forever()
+
+
+def parse_arguments(argv=None):
+    """Parse command line options"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Dream Journal & Analysis System")
+    parser.add_argument("--backend", choices=["text", "sqlite"], default=STORAGE_BACKEND,
+                        help="storage backend (default: %(default)s, or $DREAM_JOURNAL_BACKEND)")
+    parser.add_argument("--database", default=DATABASE_FILE,
+                        help="SQLite database file for the sqlite backend (default: %(default)s)")
+    parser.add_argument("--migrate", action="store_true",
+                        help="copy the text files into a new SQLite database and exit")
+    parser.add_argument("--site-stats", action="store_true",
+                        help="print dream statistics across all users and exit")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processes used by --site-stats (default: one per CPU)")
+    parser.add_argument("--import", dest="import_file", metavar="FILE",
+                        help="bulk import dreams from a CSV or JSONL file and exit")
+    parser.add_argument("--export", dest="export_file", metavar="FILE",
+                        help="export dreams to a CSV or JSONL file and exit")
+    parser.add_argument("--user", default=None,
+                        help="username for imported records without one, or the only user to export")
+    parser.add_argument("--format", choices=["csv", "jsonl"], default=None,
+                        help="import/export file format (default: guessed from the file extension)")
+    parser.add_argument("--serve", action="store_true",
+                        help="serve many users over a line protocol instead of the interactive menu")
+    parser.add_argument("--host", default="127.0.0.1", help="address --serve listens on (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=8765, help="port --serve listens on (default: %(default)s)")
+    parser.add_argument("--socket", default=None, metavar="PATH",
+                        help="serve on a Unix socket at PATH instead of a TCP port")
+    parser.add_argument("--benchmark-hash", nargs="?", const=PASSWORD_HASHER, choices=sorted(PASSWORD_HASHERS),
+                        metavar="HASHER", help="print password checks per second at several costs and exit")
+    arguments = parser.parse_args(argv)
+    try:
+        password_cost(arguments.benchmark_hash or PASSWORD_HASHER)
+    except ValueError as error:
+        parser.error(str(error))
+    return arguments
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    arguments = parse_arguments()
+    if arguments.benchmark_hash:
+        benchmark_password_hashing(arguments.benchmark_hash)
+    elif arguments.migrate:
+        counts = migrate_to_sqlite(arguments.database)
+        print(f"Migrated {counts['dreams']} dreams, {counts['users']} users, {counts['symbols']} custom symbols "
+              f"and {counts['sessions']} prompt sessions into {arguments.database}")
+    elif arguments.site_stats:
+        configure_storage(arguments.backend, arguments.database)
+        show_site_stats(arguments.workers)
+    elif arguments.import_file:
+        configure_storage(arguments.backend, arguments.database)
+        imported, errors = import_dreams(arguments.import_file, arguments.format, arguments.user)
+        for line_number, record_errors in errors:
+            display_error(f"Line {line_number}: {'; '.join(record_errors)}")
+        display_success(f"Imported {imported} dreams ({len(errors)} rejected)")
+    elif arguments.serve:
+        import asyncio
+
+        configure_storage(arguments.backend, arguments.database)
+        try:
+            asyncio.run(serve(arguments.host, arguments.port, arguments.socket))
+        except KeyboardInterrupt:
+            pass
+    elif arguments.export_file:
+        configure_storage(arguments.backend, arguments.database)
+        exported = export_dreams(arguments.export_file, arguments.format, arguments.user)
+        display_success(f"Exported {exported} dreams to {arguments.export_file}")
+    else:
+        configure_storage(arguments.backend, arguments.database)
+        main()
\ No newline at end of file
@@ -0,0 +1,201 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import dream_journal as dj
+
+
+class TempDirTestCase(unittest.TestCase):
+    """Runs each test in a fresh working directory, where the journal keeps its files"""
+
+    def setUp(self):
+        self.old_cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp()
+        os.chdir(self.directory)
+
+    def tearDown(self):
+        os.chdir(self.old_cwd)
+        shutil.rmtree(self.directory)
+
+
+def make_dream(username, title):
+    return dj.Dream(username, "2025-01-01", title, f"{title} by the sea", "calm", "lucid", 3, ["water"])
+
+
+def store_view(store, username):
+    """Everything a session can show of one user's journal"""
+    return (
+        store.count(username),
+        [(dream.id, dream.username, dream.title) for dream in store.iter_user_dreams(username)],
+        sorted(dream.title for dream in store.search(username, "sea")),
+        [dream.title for dream in store.iter_between(username, "", "")],
+        store.pattern_stats(username),
+    )
+
+
+class DreamStoreCompactionTest(TempDirTestCase):
+    """Sessions that were open while another one compacted the data file"""
+
+    def test_stale_session_after_repeated_compaction(self):
+        stale = dj.DreamStore()
+        writer = dj.DreamStore()
+        for username in ("bob", "cat", "amy"):
+            for n in range(4):
+                writer.append(make_dream(username, f"{username} {n}"))
+        self.assertEqual(stale.count("bob"), 4)
+        stale.save_index()
+
+        # Each compaction frees the previous inode, which the next one may get back
+        os.link("dreams.txt", "old.txt")
+        for username in ("bob", "cat"):
+            for dream in list(writer.iter_user_dreams(username))[:2]:
+                self.assertTrue(writer.delete(dream.id))
+            writer.compact()
+        for n in range(8):
+            writer.append(make_dream("dan", f"dan {n}"))
+        # Move the compacted file onto the first inode, as inode reuse would
+        with open("dreams.txt", "rb") as source, open("old.txt", "r+b") as target:
+            target.write(source.read())
+        os.replace("old.txt", "dreams.txt")
+
+        fresh = dj.DreamStore(index_path="fresh.idx")
+        for username in ("bob", "cat", "amy", "dan"):
+            self.assertEqual(store_view(stale, username), store_view(fresh, username))
+            for dream in stale.iter_user_dreams(username):
+                self.assertEqual(dream.username, username)
+        stale.save_index()
+
+        restarted = dj.DreamStore()
+        for username in ("bob", "cat", "amy", "dan"):
+            self.assertEqual(store_view(restarted, username), store_view(fresh, username))
+
+    def test_stale_dream_id_is_not_deleted_after_compaction(self):
+        stale = dj.DreamStore()
+        writer = dj.DreamStore()
+        writer.append(make_dream("bob", "bob 0"))
+        writer.append(make_dream("amy", "amy 0"))
+        bob_dream = next(stale.iter_user_dreams("bob"))
+
+        self.assertTrue(writer.delete(bob_dream.id))
+        writer.compact()
+
+        # bob's old id now points at amy's line
+        self.assertIsNone(stale.get_dream("bob", bob_dream.id))
+        self.assertFalse(stale.delete(bob_dream.id, dj.dream_fingerprint(bob_dream)))
+        self.assertEqual(dj.DreamStore(index_path="fresh.idx").count("amy"), 1)
+
+    def test_sessions_fuzz(self):
+        usernames = ("amy", "bob", "cat")
+        for seed in range(30):
+            with self.subTest(seed=seed):
+                os.mkdir(f"seed{seed}")
+                os.chdir(f"seed{seed}")
+                rng = random.Random(seed)
+                sessions = [dj.DreamStore() for _ in range(3)]
+                for step in range(120):
+                    store = rng.choice(sessions)
+                    username = rng.choice(usernames)
+                    action = rng.random()
+                    if action < 0.5:
+                        store.append(make_dream(username, f"{username} {step}"))
+                    elif action < 0.75:
+                        dreams = list(store.iter_user_dreams(username))
+                        if dreams:
+                            dream = rng.choice(dreams)
+                            store.delete(dream.id, dj.dream_fingerprint(dream))
+                    elif action < 0.85:
+                        store.compact()
+                    elif action < 0.95:
+                        store.save_index()
+                    else:
+                        sessions[sessions.index(store)] = dj.DreamStore()
+
+                fresh = dj.DreamStore(index_path="fresh.idx")
+                for store in sessions + [dj.DreamStore()]:
+                    for username in usernames:
+                        self.assertEqual(store_view(store, username), store_view(fresh, username))
+                os.chdir(self.directory)
+
+
+class UserDirectoryRewriteTest(TempDirTestCase):
+    """A session that was open while another one rewrote the user file"""
+
+    def test_stale_directory_after_password_rewrites(self):
+        stale = dj.UserDirectory()
+        writer = dj.UserDirectory()
+        for username in ("amy", "bob", "cat"):
+            self.assertTrue(writer.add(username, "hash", "Name"))
+        self.assertIsNotNone(stale.find("bob"))
+        stale.save_index()
+
+        # Hashes of a new length force a rewrite rather than an in-place update
+        os.link("users.txt", "old.txt")
+        self.assertTrue(writer.update_password("amy", "longer hash"))
+        self.assertTrue(writer.update_password("amy", "an even longer hash"))
+        # Move the rewritten file onto the old inode, as inode reuse would
+        with open("users.txt", "rb") as source, open("old.txt", "r+b") as target:
+            target.write(source.read())
+        os.replace("old.txt", "users.txt")
+
+        for username in ("amy", "bob", "cat"):
+            self.assertEqual(stale.find(username)['username'], username)
+        self.assertEqual(stale.find("amy")['password'], "an even longer hash")
+        self.assertFalse(stale.add("bob", "hash", "Name"))
+        self.assertEqual(dj.UserDirectory(index_path="fresh.idx").count(), 3)
+
+
+class LoginAttemptTrackerTest(TempDirTestCase):
+    """Trackers in different sessions sharing one attempts log"""
+
+    def test_stale_tracker_after_compaction(self):
+        writer = dj.LoginAttemptTracker("attempts.log", limit=3)
+        stale = dj.LoginAttemptTracker("attempts.log", limit=3)
+        for _ in range(3):
+            writer.record_failure("bob")
+        self.assertEqual(stale.failures("bob"), 3)
+
+        # Keep the old inode alive and move the compacted log onto it, as inode reuse would
+        os.link("attempts.log", "old.log")
+        writer.clear("bob")
+        for _ in range(5):
+            writer.record_failure("amy")
+        writer._compact()
+        writer.record_failure("cat")
+        with open("attempts.log", "rb") as source, open("old.log", "r+b") as target:
+            target.write(source.read())
+        os.replace("old.log", "attempts.log")
+
+        self.assertEqual(stale.failures("bob"), 0)
+        self.assertEqual(stale.failures("amy"), 3)
+        self.assertEqual(stale.failures("cat"), 1)
+
+    def test_log_without_generation_line(self):
+        with open("attempts.log", "w", encoding="ascii") as file:
+            file.write(f"F {dj.username_key('bob')} {dj.time.time():.3f}\n")
+        tracker = dj.LoginAttemptTracker("attempts.log")
+        self.assertEqual(tracker.failures("bob"), 1)
+        tracker.record_failure("bob")
+        self.assertEqual(dj.LoginAttemptTracker("attempts.log").failures("bob"), 2)
+
+
+class PasswordHashTest(unittest.TestCase):
+    """Stored hashes whose cost is out of range fail verification instead of raising"""
+
+    def test_out_of_range_costs(self):
+        salt = "00" * dj.PASSWORD_SALT_BYTES
+        for stored_hash in (f"scrypt$99${salt}$00", f"scrypt$40${salt}$00", f"scrypt$-1${salt}$00",
+                            f"pbkdf2_sha256$0${salt}$00", f"pbkdf2_sha256$999999999999${salt}$00"):
+            self.assertFalse(dj.verify_password("secret", stored_hash), stored_hash)
+
+    def test_cost_settings_are_per_hasher(self):
+        stored_hash = dj.hash_password("secret", "scrypt", 10)
+        self.assertTrue(dj.verify_password("secret", stored_hash))
+        self.assertRaises(ValueError, dj.hash_password, "secret", "scrypt", 1000)
+        self.assertEqual(dj.password_cost("scrypt"), dj.SCRYPT_LOG2_N)
+        self.assertEqual(dj.password_cost("pbkdf2_sha256"), dj.PBKDF2_ITERATIONS)
+
+
+if __name__ == "__main__":
+    unittest.main()